@@ -0,0 +1,58 @@
+"""
+Micro-benchmark da detecção da linha de cabeçalho: varredura com
+df.iterrows() (implementação anterior) versus detectar_cabecalho(). Os
+cabeçalhos repetidos (vários blocos) saem na limpeza, medida à parte.
+
+    python benchmarks/bench_cabecalho.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import torre_controle as tc
+from planilha_sintetica import CABECALHO, gerar_linhas
+
+
+def cabecalho_iterrows(df):
+    """Implementação anterior, mantida aqui apenas como referência."""
+    for i, row in df.iterrows():
+        valores = [str(v).strip().upper() for v in row.values]
+        if "STATUS" in valores:
+            return i
+    return None
+
+
+def aba_crua(linha_cabecalho, n_linhas, blocos=1):
+    linhas = [["RELATÓRIO DIÁRIO"] + [np.nan] * (len(CABECALHO) - 1) for _ in range(linha_cabecalho)]
+    por_bloco = n_linhas // blocos
+    for _ in range(blocos):
+        linhas.append(list(CABECALHO))
+        linhas.extend(gerar_linhas(por_bloco))
+    return pd.DataFrame(linhas)
+
+
+def main():
+    casos = [(0, 1_000, 1), (30, 1_000, 1), (90, 10_000, 1), (90, 100_000, 1), (5, 100_000, 4)]
+    print(f"{'cabeçalho':>9} | {'linhas':>7} | {'blocos':>6} | {'iterrows (ms)':>13} | "
+          f"{'detecção (ms)':>13} | {'limpeza (ms)':>12}")
+    for linha, n, blocos in casos:
+        df = aba_crua(linha, n, blocos)
+        assert tc.detectar_cabecalho(df) == cabecalho_iterrows(df) == linha
+        tabela = df[linha + 1:].reset_index(drop=True)
+        tabela.columns = df.iloc[linha]
+        limpo = tc.limpar_tabela(tabela.copy())
+        assert len(limpo) == n and "STATUS" not in limpo["STATUS"].cat.categories
+        t_antigo = min(timeit.repeat(lambda: cabecalho_iterrows(df), number=5, repeat=3)) / 5
+        t_novo = min(timeit.repeat(lambda: tc.detectar_cabecalho(df), number=5, repeat=3)) / 5
+        t_limpeza = min(timeit.repeat(lambda: tc.limpar_tabela(tabela.copy()), number=3, repeat=3)) / 3
+        print(f"{linha:>9} | {n:>7} | {blocos:>6} | {t_antigo * 1000:>13.2f} | "
+              f"{t_novo * 1000:>13.2f} | {t_limpeza * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Micro-benchmark dos cards do drill-down dos KPIs: um pd.Series por chamada
+(implementação anterior) versus o renderizador em lote sobre o DataFrame.
+Mede o custo por card com 10 mil cards e confere que o HTML é o mesmo.
+
+    python benchmarks/bench_cards.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import torre_controle as tc
+
+N_CARDS = 10_000
+
+
+def mini_card_por_linha(veiculo):
+    """Implementação anterior (uma linha por chamada), mantida aqui apenas como referência."""
+    status    = str(veiculo.get("STATUS", "")).strip()
+    placa     = str(veiculo.get("PLACA", "—")).strip()
+    motorista = str(veiculo.get("MOTORISTA", "")).strip()
+    if motorista.upper() in ("", "NAN", "NONE"):
+        motorista = "—"
+    cor_status = tc.CORES_STATUS.get(status, "#888888")
+    cor_fundo  = tc._hex_to_rgba(cor_status, 0.22)
+    cor_borda  = tc._hex_to_rgba(cor_status, 0.70)
+    return f"""
+    <div class="mini-card-veiculo" style="background:{cor_fundo};border:2px solid {cor_borda};border-left:5px solid {cor_status};box-shadow: 0 0 10px {tc._hex_to_rgba(cor_status, 0.18)};">
+        <span class="mini-card-placa" style="color:{cor_status};text-shadow:0 0 10px {tc._hex_to_rgba(cor_status, 0.5)};">🚛 {placa}</span>
+        <span class="mini-card-status-badge" style="background:{tc._hex_to_rgba(cor_status, 0.30)};border:1px solid {cor_status};color:{cor_status};">{status}</span>
+        <span class="mini-card-motorista">👤 {motorista}</span>
+    </div>
+    """
+
+def card_completo_por_linha(veiculo):
+    """Implementação anterior (uma linha por chamada), mantida aqui apenas como referência."""
+    # Campos prioritários — aparecem primeiro no card
+    campos_prioridade = ["POSIÇÃO ATUAL", "UF_ORIGEM", "UF_DESTINO",
+                         "DESTINO FINAL", "MOTORISTA", "OPERAÇÃO"]
+    # Campos que já ficam no cabeçalho — não repetir no corpo
+    campos_cabecalho  = {"PLACA", "STATUS", "TIPO"}
+
+    status     = str(veiculo.get("STATUS", "")).strip()
+    placa      = str(veiculo.get("PLACA",  "—")).strip()
+    tipo       = str(veiculo.get("TIPO",   "—")).strip()
+    cor_status = tc.CORES_STATUS.get(status, "#888888")
+    cor_fundo  = tc._hex_to_rgba(cor_status, 0.28)
+    cor_borda  = tc._hex_to_rgba(cor_status, 0.80)
+    cor_ib     = tc._hex_to_rgba(cor_status, 0.12)
+    cor_ib2    = tc._hex_to_rgba(cor_status, 0.35)
+
+    # Monta ordem: prioritários primeiro, depois todos os demais
+    todos_campos = list(veiculo.index)
+    campos_extras = [c for c in todos_campos
+                     if c not in campos_cabecalho and c not in campos_prioridade]
+    ordem_final = campos_prioridade + campos_extras
+
+    def _valor_valido(val):
+        """Retorna True se o valor tem conteúdo útil para exibir"""
+        if val is None:
+            return False
+        try:
+            if pd.isna(val):
+                return False
+        except (TypeError, ValueError):
+            pass
+        s = str(val).strip().upper()
+        return s not in ("", "NAN", "NONE", "NAT", "NaT".upper(), "UNNAMED")
+
+    info_items = ""
+    for campo in ordem_final:
+        val = veiculo.get(campo)
+        if not _valor_valido(val):
+            continue
+        # Formata valor: datas, números inteiros, floats
+        val_str = str(val).strip()
+        # Remove ".0" de floats que são inteiros (ex: "123.0" → "123")
+        try:
+            f = float(val_str)
+            if f == int(f):
+                val_str = str(int(f))
+        except (ValueError, TypeError):
+            pass
+
+        label = str(campo).replace("_", " ").title()
+        info_items += f"""
+        <div style="display:flex; flex-direction:column; gap:6px; padding:16px 18px;
+                    border-radius:10px; background:{cor_ib}; border:1px solid {cor_ib2};
+                    min-width:0; word-break:break-word;">
+            <span style="font-size:0.72rem; text-transform:uppercase; letter-spacing:1.1px;
+                         font-weight:700; color:{cor_status}; opacity:0.9;">{label}</span>
+            <span style="color:#ffffff; font-size:1.15rem; font-weight:600; line-height:1.3;">{val_str}</span>
+        </div>"""
+
+    divider  = f'<hr style="border:none; border-top:1px solid {cor_status}; margin:16px 0 14px 0; opacity:0.4;">' if info_items else ""
+    info_blk = f'<div style="display:grid; grid-template-columns:repeat(auto-fill, minmax(clamp(140px, 18vw, 220px), 1fr)); gap:clamp(8px, 1.2vw, 14px);">{info_items}</div>' if info_items else ""
+
+    return f"""
+    <div style="border-radius:14px; padding:30px 28px; margin-bottom:14px; box-sizing:border-box; width:100%;
+        background:{cor_fundo}; border:2px solid {cor_borda}; border-left:8px solid {cor_status};
+        box-shadow:0 0 24px {tc._hex_to_rgba(cor_status, 0.30)}, 0 4px 20px rgba(0,0,0,0.5);">
+        <div style="display:flex; flex-wrap:wrap; align-items:center; justify-content:space-between; gap:14px;">
+            <div style="display:flex; flex-wrap:wrap; align-items:center; gap:14px; min-width:0;">
+                <span style="font-size:clamp(1.6rem, 4vw, 2.2rem); font-weight:900; letter-spacing:4px;
+                             font-family:monospace; white-space:nowrap; color:{cor_status};
+                             text-shadow:0 0 20px {tc._hex_to_rgba(cor_status, 0.7)};">🚛 {placa}</span>
+                <span style="font-size:1rem; font-weight:700; padding:6px 16px; border-radius:20px;
+                             white-space:nowrap; color:#fff;
+                             background:{tc._hex_to_rgba(cor_status, 0.25)};
+                             border:1px solid {tc._hex_to_rgba(cor_status, 0.5)};">{tipo}</span>
+            </div>
+            <span style="font-size:0.85rem; font-weight:800; text-transform:uppercase; letter-spacing:1.4px;
+                         padding:9px 20px; border-radius:20px; white-space:nowrap; flex-shrink:0;
+                         background:{tc._hex_to_rgba(cor_status, 0.35)}; border:2px solid {cor_status};
+                         color:{cor_status}; box-shadow:0 0 12px {tc._hex_to_rgba(cor_status, 0.5)};">{status}</span>
+        </div>
+        {divider}
+        {info_blk}
+    </div>"""
+
+
+def compactar(html):
+    return "".join(linha.strip() for linha in html.splitlines())
+
+
+def frota_sintetica(n, seed=7):
+    rng = np.random.default_rng(seed)
+    status = list(tc.CORES_STATUS) + ["SEM STATUS"]
+    ufs = ["GO", "MT", "MS", "PR", "SP", "MG", "BA", "TO"]
+    motoristas = np.array([f"MOTORISTA {i:04d}" for i in range(800)] + ["", "nan"], dtype=object)
+    df = pd.DataFrame({
+        "PLACA": [f"ABC{i:04d}" for i in range(n)],
+        "STATUS": pd.Categorical(rng.choice(status, n)),
+        "TIPO": pd.Categorical(rng.choice(["BITREM", "CARRETA", "RODOTREM", "TRUCK"], n)),
+        "POSIÇÃO ATUAL": pd.Categorical(rng.choice([f"LUFT FILIAL {i}" for i in range(12)], n)),
+        "UF_ORIGEM": pd.Categorical(rng.choice(ufs, n)),
+        "UF_DESTINO": pd.Categorical(rng.choice(ufs, n)),
+        "DESTINO FINAL": rng.choice(np.array(["RIO VERDE", "SORRISO", "SANTOS", None], dtype=object), n),
+        "MOTORISTA": rng.choice(motoristas, n),
+        "OPERAÇÃO": rng.choice(np.array(["GRÃOS", "FERTILIZANTE", "nan"], dtype=object), n),
+        "KM": np.where(rng.random(n) < 0.2, np.nan, rng.integers(0, 900_000, n).astype(float)),
+        "PESO": rng.choice(np.array(["32.5", "41.0", "", "NONE"], dtype=object), n),
+        "PREVISÃO": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 500, n), unit="h"),
+    })
+    return df
+
+
+def medir(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    df = frota_sintetica(N_CARDS)
+    casos = [
+        ("mini", mini_card_por_linha, tc.renderizar_mini_cards),
+        ("completo", card_completo_por_linha, tc.renderizar_cards_completos),
+    ]
+    print(f"{'card':>9} | {'cards':>6} | {'antes (µs/card)':>15} | {'depois (µs/card)':>16} | {'ganho':>6}")
+    for nome, por_linha, em_lote in casos:
+        t_antes, antes = medir(lambda: [por_linha(v) for _, v in df.iterrows()])
+        t_depois, depois = min((medir(lambda: em_lote(df)) for _ in range(3)), key=lambda r: r[0])
+        # o lote já sai compactado; a versão antiga era compactada só na grade
+        assert [compactar(h) for h in antes] == depois, f"HTML diferente nos cards '{nome}'"
+        print(f"{nome:>9} | {len(df):>6} | {t_antes / len(df) * 1e6:>15.1f} | "
+              f"{t_depois / len(df) * 1e6:>16.1f} | {t_antes / t_depois:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmark da diferença entre duas versões da planilha (comparar_snapshots):
+com as placas normalizadas já calculadas (como no app, pelo IndicePlacas em
+cache) e sem elas.
+
+    python benchmarks/bench_diferenca.py [n_linhas ...]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import torre_controle as tc
+from planilha_sintetica import gerar_planilha
+
+
+def versao_seguinte(df, semente=0):
+    """Mesma frota com 5% dos motoristas e 2% dos status trocados e 1% dos veículos a menos."""
+    rng = np.random.default_rng(semente)
+    df = df.copy()
+    n = len(df)
+    df.loc[df.index[rng.choice(n, n // 20, replace=False)], "MOTORISTA"] = "MOTORISTA NOVO"
+    df.loc[df.index[rng.choice(n, n // 50, replace=False)], "STATUS"] = "CARREGADO"
+    return tc.limpar_colunas_texto(df.iloc[n // 100:].reset_index(drop=True))
+
+
+def main(tamanhos):
+    print(f"{'linhas':>8} | {'alterações':>10} | {'placas em cache (ms)':>20} | {'sem cache (ms)':>14}")
+    for n in tamanhos:
+        anterior = tc.load_data_from_file(gerar_planilha(n))
+        atual = versao_seguinte(anterior)
+        placas_anterior, placas_atual = tc.placas_por_linha(anterior), tc.placas_por_linha(atual)
+        com_cache = lambda: tc.comparar_snapshots(anterior, atual, placas_anterior=placas_anterior,
+                                                  placas_atual=placas_atual)
+        sem_cache = lambda: tc.comparar_snapshots(anterior, atual)
+        alteracoes = len(com_cache().alteracoes)
+        t_cache = min(timeit.repeat(com_cache, number=5, repeat=3)) / 5
+        t_sem = min(timeit.repeat(sem_cache, number=5, repeat=3)) / 5
+        print(f"{n:>8} | {alteracoes:>10} | {t_cache * 1000:>20.2f} | {t_sem * 1000:>14.2f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
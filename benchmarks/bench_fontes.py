@@ -0,0 +1,47 @@
+"""
+Benchmark da leitura de várias fontes: em sequência no processo atual versus
+no pool de leitura (forkserver, um processo por núcleo). A primeira carga
+no pool inclui a subida dos processos; as seguintes os reaproveitam.
+
+    python benchmarks/bench_fontes.py [n_fontes] [n_linhas]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import torre_controle as tc
+from planilha_sintetica import gerar_planilha
+
+
+def medir(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def main(n_fontes, n_linhas):
+    tarefas = [(f"frota_{i}.xlsx", gerar_planilha(n_linhas, semente=i).getvalue(), tc.ABA_FROTA)
+               for i in range(n_fontes)]
+    pool = tc.obter_pool_leitura()
+    print(f"{n_fontes} fontes × {n_linhas} linhas, {os.cpu_count()} núcleo(s), "
+          f"pool: {'não' if pool is None else f'{tc.PROCESSOS_LEITURA} processos'}")
+
+    t_seq, sequencial = medir(lambda: [tc._processar_fonte(*tarefa) for tarefa in tarefas])
+    print(f"{'em sequência':>24}: {t_seq:>7.3f} s")
+    if pool is None:
+        return
+    for rotulo in ("pool (primeira carga)", "pool (processos prontos)"):
+        t_pool, paralelo = medir(lambda: tc._executar_tarefas(tarefas))
+        for (df_seq, _), (df_pool, _) in zip(sequencial, paralelo):
+            pd.testing.assert_frame_equal(df_seq, df_pool)
+        print(f"{rotulo:>24}: {t_pool:>7.3f} s  ({t_seq / t_pool:.1f}x)")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    argumentos = [int(a) for a in sys.argv[1:]]
+    main(*(argumentos + [4, 20_000][len(argumentos):]))
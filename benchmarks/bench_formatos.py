@@ -0,0 +1,52 @@
+"""
+Benchmark do carregamento por formato: a mesma frota como .xlsx (motor
+streaming), CSV (lido em lotes, só texto) e Parquet (só as colunas usadas),
+todos passando pelo mesmo pipeline de limpeza.
+
+    python benchmarks/bench_formatos.py [n_linhas ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import torre_controle as tc
+from planilha_sintetica import gerar_csv, gerar_parquet, gerar_planilha
+
+
+def medir(funcao, repeticoes=3):
+    melhor = float("inf")
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main(tamanhos):
+    print(f"{'linhas':>8} | {'formato':>7} | {'arquivo (MB)':>12} | {'tempo (s)':>9} | {'memória df (MB)':>15}")
+    for n in tamanhos:
+        repeticoes = 1 if n >= 100_000 else 3
+        referencia = None
+        for formato, gerar in (("xlsx", gerar_planilha), ("csv", gerar_csv), ("parquet", gerar_parquet)):
+            arquivo = gerar(n)
+            tempo, df = medir(lambda: tc.load_data_from_file(arquivo), repeticoes)
+            if referencia is None:
+                referencia = df
+            # as colunas de texto saem iguais em qualquer formato
+            for col in tc.COLUNAS_TEXTO:
+                if col in referencia.columns:
+                    pd.testing.assert_series_equal(
+                        referencia[col].reset_index(drop=True), df[col].reset_index(drop=True)
+                    )
+            tamanho = arquivo.getbuffer().nbytes / 2**20
+            memoria = df.memory_usage(deep=True).sum() / 2**20
+            print(f"{n:>8} | {formato:>7} | {tamanho:>12.1f} | {tempo:>9.3f} | {memoria:>15.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 200_000])
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark dos gráficos de barras: um go.Bar por categoria
+(implementação anterior) versus um único trace com as cores em array.
+Mede o tempo de montagem da figura e o tamanho do JSON enviado ao navegador.
+
+    python benchmarks/bench_graficos.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import torre_controle as tc
+
+UFS_BRASIL = ["AC", "AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG", "PA",
+              "PB", "PR", "PE", "PI", "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO"]
+
+
+def grafico_um_trace_por_categoria(df, coluna, paleta, layout, horizontal=False):
+    """Implementação anterior, mantida aqui apenas como referência."""
+    fig = go.Figure()
+    for idx, row in df.iterrows():
+        cor = paleta(row[coluna]) if callable(paleta) else paleta[idx % len(paleta)]
+        eixos = dict(y=[row[coluna]], x=[row["QUANTIDADE"]]) if horizontal else dict(x=[row[coluna]], y=[row["QUANTIDADE"]])
+        fig.add_trace(go.Bar(
+            **eixos, orientation='h' if horizontal else 'v',
+            marker=dict(color=cor, line=dict(color='rgba(255,255,255,0.2)', width=1)),
+            text=row["QUANTIDADE"], textposition='outside',
+            textfont=dict(color='#ffffff', size=20, family='Arial Black'),
+            hovertemplate='<b>%{x}</b><br>Quantidade: %{y}<extra></extra>', showlegend=False
+        ))
+    fig.update_layout(layout)
+    return fig
+
+
+def contagem(coluna, categorias):
+    return pd.DataFrame({coluna: categorias, "QUANTIDADE": range(len(categorias), 0, -1)})
+
+
+def main():
+    cor_status = lambda s: tc.CORES_STATUS.get(s, "#888888")
+    tipos = [f"TIPO {i:02d}" for i in range(30)]
+    casos = [
+        ("status", contagem("STATUS", tc.ORDEM_STATUS), "STATUS", cor_status, True, tc.criar_grafico_status),
+        ("tipo (30)", contagem("TIPO", tipos), "TIPO", tc.CORES_TIPO_VEICULO, False, tc.criar_grafico_tipo),
+        ("uf (27)", contagem("UF_ORIGEM", UFS_BRASIL), "UF_ORIGEM", tc.CORES_UF, False, tc.criar_grafico_uf_origem),
+    ]
+    print(f"{'gráfico':>10} | {'barras':>6} | {'antes (ms)':>10} | {'depois (ms)':>11} | {'JSON antes':>10} | {'JSON depois':>11}")
+    for nome, df, coluna, paleta, horizontal, novo in casos:
+        # mesmo layout nas duas versões: a diferença medida é só a dos traces
+        layout = novo(df).layout.to_plotly_json()
+        layout.pop("template", None)
+        antigo = lambda: grafico_um_trace_por_categoria(df, coluna, paleta, layout, horizontal)
+        fig_antiga, fig_nova = antigo(), novo(df)
+        assert len(fig_nova.data) == 1 and len(fig_antiga.data) == len(df)
+        t_antigo = min(timeit.repeat(antigo, number=5, repeat=3)) / 5
+        t_novo = min(timeit.repeat(lambda: novo(df), number=5, repeat=3)) / 5
+        json_antigo = len(pio.to_json(fig_antiga, validate=False))
+        json_novo = len(pio.to_json(fig_nova, validate=False))
+        print(f"{nome:>10} | {len(df):>6} | {t_antigo * 1000:>10.2f} | {t_novo * 1000:>11.2f} | {json_antigo:>10} | {json_novo:>11}")
+
+
+if __name__ == "__main__":
+    main()
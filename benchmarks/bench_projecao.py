@@ -0,0 +1,56 @@
+"""
+Benchmark da projeção de colunas: uma frota larga (colunas extras além das que
+o dashboard usa) carregada inteira versus só o núcleo, e o custo da leitura
+tardia das colunas extras, paga só quando um card de veículo é aberto.
+
+    python benchmarks/bench_projecao.py [n_linhas ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import torre_controle as tc
+from planilha_sintetica import gerar_csv, gerar_parquet, gerar_planilha
+
+COLUNAS_EXTRAS = 30
+
+
+def medir(funcao, repeticoes=3):
+    melhor = float("inf")
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main(tamanhos):
+    print(f"{'linhas':>8} | {'formato':>7} | {'carga':>7} | {'colunas':>7} | {'tempo (s)':>9} | {'memória df (MB)':>15}")
+    for n in tamanhos:
+        repeticoes = 1 if n >= 50_000 else 3
+        for formato, gerar in (("xlsx", gerar_planilha), ("csv", gerar_csv), ("parquet", gerar_parquet)):
+            arquivo = gerar(n, colunas_extras=COLUNAS_EXTRAS)
+            cargas = (
+                ("inteira", None),
+                ("núcleo", tc.PROJECAO_NUCLEO),
+                ("extras", tc.PROJECAO_EXTRAS),
+            )
+            dfs = {}
+            for nome, projecao in cargas:
+                tempo, df = medir(lambda: tc.preparar_aba(arquivo, tc.ABA_FROTA, projecao=projecao), repeticoes)
+                dfs[nome] = df
+                memoria = df.memory_usage(deep=True).sum() / 2**20
+                print(f"{n:>8} | {formato:>7} | {nome:>7} | {len(df.columns):>7} | {tempo:>9.3f} | {memoria:>15.1f}")
+            # núcleo + extras, juntos pela chave de linha (o índice), reconstroem a carga inteira
+            inteira = dfs["inteira"]
+            junto = pd.concat([dfs["núcleo"], dfs["extras"].reindex(dfs["núcleo"].index)], axis=1)
+            pd.testing.assert_frame_equal(junto[list(inteira.columns)], inteira)
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
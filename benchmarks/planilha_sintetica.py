@@ -0,0 +1,103 @@
+"""
+Geração de planilhas sintéticas de frota para os benchmarks.
+
+Reproduz o layout real da aba "Frota Agro ": linhas de título antes do
+cabeçalho, duas colunas "UF" (origem/destino), espaços duplos, células
+vazias e linhas formatadas vazias no fim da aba.
+"""
+import csv
+import io
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+from openpyxl import Workbook
+
+STATUS = [
+    "MANUTENÇÃO", "DISPONÍVEIS NÃO TRIPULADO", "CARREGADO", "RETORNANDO DISPONÍVEIS",
+    "DISPONÍVEIS TRIPULADO", "APOIO FILIAL", "INDISPONÍVEIS", "FORA DE OPERAÇÃO",
+    "RETORNANDO INDISPONÍVEIS",
+]
+TIPOS = ["TRUCK", "CARRETA", "BITREM", "RODOTREM", "TOCO", "VANDERLEIA"]
+POSICOES = [f"LUFT  {c}" if i % 3 == 0 else f"LUFT {c}" for i, c in enumerate([
+    "BARUERI", "CAMPINAS", "RONDONÓPOLIS", "SORRISO", "RIO VERDE", "CASCAVEL",
+    "UBERLÂNDIA", "PARANAGUÁ", "SANTOS", "LUCAS DO RIO VERDE", "JATAÍ", "DOURADOS",
+])]
+UFS = ["SP", "MT", "GO", "PR", "MG", "MS", "BA", "TO"]
+CABECALHO = ["STATUS", "TIPO", "POSIÇÃO ATUAL", "PLACA", "MOTORISTA", "OPERAÇÃO",
+             "UF", "DESTINO FINAL", "UF", "DATA ATUALIZAÇÃO", "KM", "OBSERVAÇÃO"]
+
+
+def cabecalho(colunas_extras=0):
+    """Cabeçalho da aba; `colunas_extras` acrescenta campos que só o card do veículo mostra."""
+    return CABECALHO + [f"CAMPO {j:02d}" for j in range(colunas_extras)]
+
+
+def _campo_extra(rnd, base, i, j):
+    if j % 3 == 0:
+        return base + timedelta(minutes=rnd.randint(0, 500_000))
+    if j % 3 == 1:
+        return float(rnd.randint(0, 99_999)) / 10
+    return f"INFO {rnd.randint(1, 5000)}" if (i + j) % 7 else None
+
+
+def gerar_linhas(n_linhas, semente=42, colunas_extras=0):
+    rnd = random.Random(semente)
+    base = datetime(2025, 1, 1)
+    for i in range(n_linhas):
+        linha = [
+            rnd.choice(STATUS).lower() if i % 17 == 0 else rnd.choice(STATUS),
+            rnd.choice(TIPOS) if i % 29 else None,
+            rnd.choice(POSICOES),
+            f"{''.join(rnd.choice('ABCDEFGHIJ') for _ in range(3))}{rnd.randint(1000, 9999)}",
+            f" MOTORISTA {rnd.randint(1, 900)} " if i % 11 else None,
+            rnd.choice(["SOJA", "MILHO", "ALGODÃO", "FERTILIZANTE"]),
+            rnd.choice(UFS),
+            rnd.choice(POSICOES).replace("LUFT", "CLIENTE"),
+            rnd.choice(UFS),
+            base + timedelta(hours=i),
+            float(rnd.randint(1000, 900000)) if i % 5 else rnd.random() * 1000,
+            "N/A" if i % 13 == 0 else None,
+        ]
+        linha.extend(_campo_extra(rnd, base, i, j) for j in range(colunas_extras))
+        yield linha
+
+
+def gerar_planilha(n_linhas, linhas_vazias_fim=200, semente=42, colunas_extras=0):
+    """Devolve um BytesIO com um .xlsx sintético de `n_linhas` veículos."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Frota Agro ")
+    ws.append(["TORRE DE CONTROLE - FROTA AGRO"])
+    ws.append([])
+    ws.append(cabecalho(colunas_extras))
+    for linha in gerar_linhas(n_linhas, semente, colunas_extras):
+        ws.append(linha)
+    for _ in range(linhas_vazias_fim):
+        ws.append([None] * len(cabecalho(colunas_extras)))
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def gerar_csv(n_linhas, separador=";", codificacao="cp1252", semente=42, colunas_extras=0):
+    """Mesmos dados como CSV de exportação: título, cabeçalho e linhas."""
+    texto = io.StringIO()
+    escritor = csv.writer(texto, delimiter=separador, lineterminator="\r\n")
+    escritor.writerow(["TORRE DE CONTROLE - FROTA AGRO"])
+    escritor.writerow(cabecalho(colunas_extras))
+    escritor.writerows(gerar_linhas(n_linhas, semente, colunas_extras))
+    return io.BytesIO(texto.getvalue().encode(codificacao))
+
+
+def gerar_parquet(n_linhas, semente=42, colunas_extras=0):
+    """Mesmos dados como Parquet (UFs já com nomes distintos, como exporta o TMS)."""
+    colunas = [c if c != "UF" else None for c in cabecalho(colunas_extras)]
+    colunas[colunas.index(None)] = "UF_ORIGEM"
+    colunas[colunas.index(None)] = "UF_DESTINO"
+    df = pd.DataFrame(list(gerar_linhas(n_linhas, semente, colunas_extras)), columns=colunas)
+    df["KM"] = df["KM"].astype(float)
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,16 @@
+"""
+Tarefa executada nos processos do pool de leitura (ver obter_pool_leitura
+em torre_controle.py).
+
+Fica num módulo próprio porque o Streamlit executa o app como __main__: uma
+função definida lá é serializada como "__main__._processar_fonte", nome que
+não existe nos processos do pool. Aqui o pickle guarda
+"leitura_fontes.processar_fonte", e o processo importa o torre_controle pelo
+nome (o forkserver já o deixa carregado; ver set_forkserver_preload).
+"""
+
+
+def processar_fonte(nome, dados, aba, projecao, motor):
+    """(DataFrame limpo, None) ou (None, mensagem de erro) de uma fonte."""
+    import torre_controle
+    return torre_controle._processar_fonte(nome, dados, aba, projecao, motor)
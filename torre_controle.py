@@ -1,10 +1,39 @@
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from dataclasses import dataclass
 from datetime import datetime
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
 import streamlit as st
 import base64
+import csv
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import posixpath
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+import zipfile
+from xml.parsers import expat
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+import leitura_fontes
 
 #  >    executar  >   python -m streamlit run torre_controle.py  
 
@@ -77,16 +106,41 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# =====================================================
+# RECURSOS ESTÁTICOS
+# =====================================================
+# Com server.enableStaticServing (.streamlit/config.toml) a pasta static/ ao lado
+# do script é servida em app/static/: o navegador baixa e guarda a imagem uma vez,
+# em vez de receber o PNG inline a cada rerun. static/ traz versões reduzidas
+# (splash em JPEG 1024px, logo em 768px); os originais na raiz ficam como reserva.
+DIRETORIO_APP = os.path.dirname(os.path.abspath(__file__))
+PASTA_ESTATICA = os.path.join(DIRETORIO_APP, "static")
+TIPOS_IMAGEM = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+
 def get_base64_image(image_path):
     try:
         with open(image_path, "rb") as img_file:
             return base64.b64encode(img_file.read()).decode()
-    except:
+    except OSError:
         return None
 
+@st.cache_resource(show_spinner=False)
+def url_imagem(arquivo_estatico, arquivo_original):
+    """src para <img>: URL de app/static quando o servidor expõe a pasta, senão
+    data URI codificado uma única vez por processo. None se a imagem não existir."""
+    caminho_estatico = os.path.join(PASTA_ESTATICA, arquivo_estatico)
+    if os.path.isfile(caminho_estatico) and st.get_option("server.enableStaticServing"):
+        return f"app/static/{arquivo_estatico}"
+    for caminho in (caminho_estatico, os.path.join(DIRETORIO_APP, arquivo_original)):
+        img_base64 = get_base64_image(caminho)
+        if img_base64:
+            tipo = TIPOS_IMAGEM.get(os.path.splitext(caminho)[1].lower(), "image/png")
+            return f"data:{tipo};base64,{img_base64}"
+    return None
+
 def show_loading_screen(placeholder):
-    img_base64 = get_base64_image("luft.png")
-    if img_base64:
+    img_src = url_imagem("luft.jpg", "luft.png")
+    if img_src:
         loading_html = f"""
         <style>
         .loading-overlay {{
@@ -107,7 +161,7 @@ def show_loading_screen(placeholder):
         @keyframes blink {{ 0%, 100% {{ opacity: 0.5; }} 50% {{ opacity: 1; }} }}
         </style>
         <div class="loading-overlay">
-            <img src="data:image/png;base64,{img_base64}" class="loading-image" alt="Loading">
+            <img src="{img_src}" class="loading-image" alt="Loading">
             <div class="loading-text">CARREGANDO DADOS...</div>
         </div>
         """
@@ -132,9 +186,28 @@ def show_loading_screen(placeholder):
 # =====================================================
 # CSS CUSTOMIZADO
 # =====================================================
-def load_custom_css():
-    st.markdown(f"""
-    <style>
+# O tema sai dos dicionários CORES_* e não muda durante o processo: a folha é
+# compilada e minificada uma vez e injetada por um único st.html. Como o elemento
+# é idêntico byte a byte em todo rerun e passa de global.minCachedMessageSize
+# (10 KB), o Streamlit só o envia na primeira execução da sessão; nas seguintes
+# manda apenas a referência ao hash que o navegador já guardou.
+_COMENTARIO_CSS = re.compile(r"/\*.*?\*/", re.S)
+_ESPACO_CSS = re.compile(r"\s+")
+_ESPACO_PONTUACAO_CSS = re.compile(r"\s*([{};,>])\s*")
+
+def minificar_css(css):
+    """Remove comentários e espaços supérfluos. Conservador: só tira o espaço
+    depois de ':' (antes dele, como em `a :hover`, o espaço tem significado)."""
+    css = _COMENTARIO_CSS.sub("", css)
+    css = _ESPACO_CSS.sub(" ", css)
+    css = _ESPACO_PONTUACAO_CSS.sub(r"\1", css)
+    return css.replace(";}", "}").replace(": ", ":").replace(" !important", "!important").strip()
+
+def bloco_estilo(css):
+    return f"<style>{minificar_css(css)}</style>"
+
+def _css_tema():
+    return f"""
     * {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif !important; }}
     header[data-testid="stHeader"] {{ background-color: rgba(0,0,0,0) !important; backdrop-filter: none !important; }}
     header[data-testid="stHeader"] > div:first-child {{ background-color: transparent !important; }}
@@ -492,8 +565,82 @@ def load_custom_css():
         box-shadow: 0 0 12px #ffffff, 0 0 24px rgba(255,0,0,0.8) !important;
         color: white !important;
     }}
-    </style>
-    """, unsafe_allow_html=True)
+    .centered-warning {{ display: flex; justify-content: center; align-items: center; min-height: 60vh; text-align: center; }}
+    .warning-box {{ background-color: #1e1e1e; border: 2px solid #ff9800; border-radius: 15px; padding: 40px 60px; box-shadow: 0 0 20px rgba(255, 152, 0, 0.3); }}
+    .warning-icon {{ font-size: 4rem; margin-bottom: 20px; }}
+    .warning-text {{ font-size: 1.3rem; color: #ffffff; font-weight: 600; line-height: 1.6; }}
+    /* Tooltips (o Streamlit gera classes dinâmicas) */
+    [class*="TooltipContent"], [class*="tooltip"] {{ background: #1a1a1a !important; color: #fff !important; border: 1px solid #555 !important; }}
+    [class*="TooltipContent"] * {{ color: #fff !important; }}
+    """
+
+@st.cache_resource(show_spinner=False)
+def compilar_css():
+    """Folha de estilo do tema, montada e minificada uma vez por processo."""
+    return bloco_estilo(_css_tema())
+
+def load_custom_css():
+    st.html(compilar_css())
+
+# Estilos das telas cheias, anexados só quando a tela está aberta
+CSS_TELA_CHEIA = bloco_estilo("""
+    section[data-testid="stSidebar"] { display: none !important; }
+    .main .block-container {
+        padding: 1rem 1.5rem !important;
+        max-width: 100% !important;
+    }
+""")
+
+CSS_BOTAO_VOLTAR = bloco_estilo("""
+    div[role="dialog"] button[kind="secondary"] {
+        background: #e65100 !important;
+        color: #ffffff !important;
+        border: 2px solid #ff6d00 !important;
+        border-radius: 8px !important;
+        font-size: 1rem !important;
+        font-weight: 900 !important;
+        padding: 8px 24px !important;
+        letter-spacing: 1.2px !important;
+        box-shadow: 0 0 18px rgba(230,81,0,0.75), 0 2px 8px rgba(0,0,0,0.5) !important;
+        min-width: 130px !important;
+    }
+    div[role="dialog"] button[kind="secondary"]:hover {
+        background: #bf360c !important;
+        box-shadow: 0 0 28px rgba(230,81,0,1) !important;
+        transform: scale(1.04) !important;
+    }
+""")
+
+CSS_BOTAO_FECHAR = bloco_estilo("""
+    /* Botão FECHAR — vermelho vivo, canto superior direito do dialog */
+    div[role="dialog"] [data-testid="stButton"]:has(button[kind="secondary"]) {
+        display: flex;
+        justify-content: flex-end;
+    }
+    div[role="dialog"] button[kind="secondary"] {
+        background: #c62828 !important;
+        color: #ffffff !important;
+        border: 2px solid #ef5350 !important;
+        border-radius: 8px !important;
+        font-size: 1rem !important;
+        font-weight: 900 !important;
+        padding: 8px 24px !important;
+        letter-spacing: 1.2px !important;
+        box-shadow: 0 0 18px rgba(198,40,40,0.75), 0 2px 8px rgba(0,0,0,0.5) !important;
+        min-width: 130px !important;
+    }
+    div[role="dialog"] button[kind="secondary"]:hover {
+        background: #b71c1c !important;
+        box-shadow: 0 0 28px rgba(198,40,40,1) !important;
+        transform: scale(1.04) !important;
+    }
+""")
+
+CSS_GRAFICO_TELA_CHEIA = bloco_estilo("""
+    section[data-testid="stSidebar"] { display: none !important; }
+    .stApp { background: #141414 !important; }
+    .main .block-container { padding: 1rem 1.5rem !important; max-width: 100% !important; background: #141414 !important; }
+""")
 
 # =====================================================
 # CONSTANTES
@@ -505,6 +652,38 @@ STATUS_OFICIAIS = [
 STATUS_ADICIONAIS = ["INDISPONÍVEIS", "FORA DE OPERAÇÃO", "RETORNANDO INDISPONÍVEIS"]
 ORDEM_STATUS = STATUS_OFICIAIS + STATUS_ADICIONAIS
 
+# Agrupamentos de STATUS usados pelos KPIs
+STATUS_EM_OPERACAO = ["CARREGADO", "RETORNANDO DISPONÍVEIS"]
+STATUS_DISPONIVEIS = ["DISPONÍVEIS TRIPULADO", "DISPONÍVEIS NÃO TRIPULADO"]
+STATUS_MANUTENCAO  = ["MANUTENÇÃO"]
+
+# Colunas de texto limpas (strip/upper/espaços) no carregamento
+COLUNAS_TEXTO = ["STATUS", "TIPO", "POSIÇÃO ATUAL", "PLACA",
+                 "MOTORISTA", "OPERAÇÃO", "UF_ORIGEM", "UF_DESTINO", "DESTINO FINAL"]
+
+# Colunas de baixa cardinalidade guardadas como Categorical: filtros (isin)
+# e contagens (value_counts) passam a operar sobre os códigos inteiros
+COLUNAS_CATEGORICAS = ["STATUS", "TIPO", "POSIÇÃO ATUAL", "UF_ORIGEM", "UF_DESTINO"]
+
+# Ordem fixa das categorias (as demais vêm depois, em ordem alfabética)
+ORDEM_CATEGORIAS = {"STATUS": ORDEM_STATUS}
+
+# Projeção de colunas na leitura. O núcleo — o que filtros, gráficos, tabela,
+# busca, diferença e histórico usam — é lido no carregamento; as demais colunas
+# só aparecem no card do veículo e são lidas na primeira abertura de um card.
+# Os nomes são os do cabeçalho (strip + upper): "UF" vira UF_ORIGEM/UF_DESTINO.
+COLUNAS_NUCLEO = set(COLUNAS_TEXTO) | {"UF"}
+PROJECAO_NUCLEO, PROJECAO_EXTRAS = "nucleo", "extras"
+
+def manter_coluna(nome, projecao):
+    """Se a coluna de cabeçalho `nome` entra na leitura com a `projecao` (None = todas)."""
+    if projecao == PROJECAO_NUCLEO:
+        return nome in COLUNAS_NUCLEO
+    if projecao == PROJECAO_EXTRAS:
+        # STATUS vai junto: é o filtro de linhas que alinha os extras ao núcleo
+        return nome == "STATUS" or nome not in COLUNAS_NUCLEO
+    return True
+
 # =====================================================
 # PROCESSAMENTO DE DADOS
 # =====================================================
@@ -523,74 +702,621 @@ def renomear_colunas_duplicadas(df):
     df.columns = cols
     return df
 
-@st.cache_data
-def load_data_from_file(file_source):
+def normalizar_coluna_texto(serie, categorica=False, ordem=None):
+    """
+    strip + upper + espaços internos colapsados; vazio, 'NAN', 'NONE' e 'NAT'
+    viram nulo. A coluna é fatorizada antes, então a limpeza de texto roda só
+    sobre os valores distintos. Com `categorica=True` devolve um Categorical
+    cujas categorias começam por `ordem` (fixa) seguida dos demais valores.
+    """
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    limpos = (
+        pd.Series(unicos, dtype=object).astype(str)
+        .str.strip()
+        .str.upper()
+        .str.replace(r'\s+', ' ', regex=True)  # ← normaliza espaços internos
+    )
+    limpos = limpos.where(~limpos.isin(["NAN", "NONE", "NAT", ""]))
+    # Valores distintos na origem podem coincidir depois da limpeza ("a " e "A")
+    codigos_limpos, valores = pd.factorize(limpos, use_na_sentinel=True)
+    codigos_limpos = np.append(codigos_limpos, -1)   # posição extra para os nulos de origem
+    codigos = codigos_limpos[codigos]
+
+    if categorica:
+        presentes = set(valores)
+        fixas = list(ordem or [])
+        categorias = fixas + sorted(presentes.difference(fixas))
+        codigos = np.append(pd.Index(categorias).get_indexer(valores), -1)[codigos]
+        return pd.Series(pd.Categorical.from_codes(codigos, categorias), index=serie.index, name=serie.name)
+
+    textos = np.append(np.asarray(valores, dtype=object), pd.NA)
+    return pd.Series(textos[codigos], index=serie.index, name=serie.name, dtype=object)
+
+# =====================================================
+# LEITURA DA PLANILHA (MOTOR STREAMING)
+# =====================================================
+ABA_FROTA = "Frota Agro "
+
+# "streaming" → parser expat sobre o XML da aba, montando arrays por coluna
+# "pandas"    → pd.read_excel (caminho original, usado também para .xls)
+MOTOR_LEITURA_PADRAO = "streaming"
+
+# Mesmos marcadores de vazio que o pd.read_excel converte em NaN
+# (na_values padrão do pandas + códigos de erro do Excel)
+VALORES_NA_EXCEL = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null", "#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!",
+])
+
+class ErroCarregamento(Exception):
+    """Arquivo lido, mas sem dados utilizáveis; a mensagem vai direto para o usuário."""
+
+def _eh_xlsx(file_source):
+    """True se o arquivo é um pacote OOXML (.xlsx) legível sem o openpyxl."""
+    if hasattr(file_source, "seek"):
+        file_source.seek(0)
     try:
-        # ── Lê a planilha sem assumir que a linha 0 é cabeçalho ──
-        df = pd.read_excel(file_source, sheet_name="Frota Agro ", header=None)
-
-        if df.empty:
-            st.error("❌ A planilha está vazia!")
-            return pd.DataFrame()
-
-        # ── Detecta dinamicamente onde está a linha de cabeçalho ──
-        # Procura a primeira linha que contenha "STATUS" (case-insensitive)
-        header_row = None
-        for i, row in df.iterrows():
-            valores = [str(v).strip().upper() for v in row.values]
-            if "STATUS" in valores:
-                header_row = i
-                break
+        return zipfile.is_zipfile(file_source)
+    finally:
+        if hasattr(file_source, "seek"):
+            file_source.seek(0)
+
+class _NomesLocais(dict):
+    """Cache tag → nome local ("x:row" → "row"), sem processar namespaces no expat."""
+    def __missing__(self, tag):
+        nome = self[tag] = tag.rpartition(":")[2]
+        return nome
+
+_NOMES_LOCAIS = _NomesLocais()
+
+def _parse_xml(dados, inicio=None, fim=None, texto=None):
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    if inicio:
+        parser.StartElementHandler = inicio
+    if fim:
+        parser.EndElementHandler = fim
+    if texto:
+        parser.CharacterDataHandler = texto
+    parser.Parse(dados, True)
+
+def _localizar_aba(pacote, aba):
+    """Caminho do XML da aba dentro do pacote + calendário (1900/1904)."""
+    rid = None
+    epoca = CALENDAR_WINDOWS_1900
+
+    def inicio(tag, attrs):
+        nonlocal rid, epoca
+        nome = _NOMES_LOCAIS[tag]
+        if nome == "sheet" and attrs.get("name") == aba:
+            rid = next(v for k, v in attrs.items() if _NOMES_LOCAIS[k] == "id")
+        elif nome == "workbookPr" and attrs.get("date1904") in ("1", "true"):
+            epoca = CALENDAR_MAC_1904
+
+    _parse_xml(pacote.read("xl/workbook.xml"), inicio)
+    if rid is None:
+        # Mesma exceção/mensagem do pandas para manter o tratamento de erro
+        raise ValueError(f"Worksheet named '{aba}' not found")
+
+    alvo = None
+
+    def inicio_rels(tag, attrs):
+        nonlocal alvo
+        if _NOMES_LOCAIS[tag] == "Relationship" and attrs.get("Id") == rid:
+            alvo = attrs["Target"]
+
+    _parse_xml(pacote.read("xl/_rels/workbook.xml.rels"), inicio_rels)
+    caminho = alvo.lstrip("/") if alvo.startswith("/") else posixpath.normpath(posixpath.join("xl", alvo))
+    return caminho, epoca
+
+def _ler_strings_compartilhadas(pacote):
+    if "xl/sharedStrings.xml" not in pacote.namelist():
+        return []
+    strings = []
+    partes = []
+    dentro_t = False
+    fonetico = 0   # <rPh> (furigana) não entra no conteúdo, igual ao openpyxl
+
+    def inicio(tag, attrs):
+        nonlocal dentro_t, fonetico
+        nome = _NOMES_LOCAIS[tag]
+        if nome == "t" and not fonetico:
+            dentro_t = True
+        elif nome == "rPh":
+            fonetico += 1
+
+    def fim(tag):
+        nonlocal dentro_t, fonetico
+        nome = _NOMES_LOCAIS[tag]
+        if nome == "t":
+            dentro_t = False
+        elif nome == "rPh":
+            fonetico -= 1
+        elif nome == "si":
+            strings.append("".join(partes))
+            partes.clear()
+
+    def texto(dados):
+        if dentro_t:
+            partes.append(dados)
+
+    _parse_xml(pacote.read("xl/sharedStrings.xml"), inicio, fim, texto)
+    return strings
+
+def _ler_formatos_data(pacote):
+    """Índices de estilo (cellXfs) com formato de data e de duração."""
+    if "xl/styles.xml" not in pacote.namelist():
+        return set(), set()
+    personalizados = {}
+    estilos = []
+    em_cellxfs = False
+
+    def inicio(tag, attrs):
+        nonlocal em_cellxfs
+        nome = _NOMES_LOCAIS[tag]
+        if nome == "numFmt":
+            personalizados[int(attrs["numFmtId"])] = attrs.get("formatCode", "")
+        elif nome == "cellXfs":
+            em_cellxfs = True
+        elif nome == "xf" and em_cellxfs:
+            estilos.append(int(attrs.get("numFmtId", 0)))
+
+    def fim(tag):
+        nonlocal em_cellxfs
+        if _NOMES_LOCAIS[tag] == "cellXfs":
+            em_cellxfs = False
+
+    _parse_xml(pacote.read("xl/styles.xml"), inicio, fim)
+    datas, duracoes = set(), set()
+    for idx, num_fmt in enumerate(estilos):
+        formato = personalizados.get(num_fmt, BUILTIN_FORMATS.get(num_fmt))
+        if formato and is_date_format(formato):
+            datas.add(idx)
+            if is_timedelta_format(formato):
+                duracoes.add(idx)
+    return datas, duracoes
+
+def _converter_coluna_excel(valores):
+    """
+    Converte a tupla de valores crus de uma coluna num array tipado,
+    reproduzindo a inferência do pd.read_excel: vazios/erros viram NaN,
+    floats inteiros viram int e colunas 100% numéricas viram numéricas.
+    """
+    serie = pd.Series(valores, dtype=object)
+    vazios = serie.isna() | serie.isin(VALORES_NA_EXCEL)
+    serie = serie.where(~vazios, np.nan)
+
+    # Excel grava 5 como 5.0 — o pandas devolve int quando não há parte decimal
+    floats = serie.map(type).eq(float)
+    if floats.any():
+        inteiros = floats & serie.where(floats, 0.0).astype(float).mod(1).eq(0)
+        if inteiros.any():
+            serie[inteiros] = serie[inteiros].map(int)
+
+    if vazios.all():
+        return serie.astype(float)
+    try:
+        return pd.to_numeric(serie)
+    except (ValueError, TypeError):
+        return serie
 
-        if header_row is None:
-            # Fallback: assume linha 0 como cabeçalho
-            header_row = 0
-
-        df.columns = df.iloc[header_row]
-        df = df[header_row + 1:].reset_index(drop=True)
-
-        # ── Remove colunas completamente vazias ──
-        df = df.dropna(axis=1, how='all')
-
-        # ── Normaliza nomes de colunas (strip + upper) ──
-        df.columns = [str(c).strip().upper() if pd.notna(c) else f"COL_{i}"
-                      for i, c in enumerate(df.columns)]
-
-        # ── Renomeia colunas duplicadas (ex: UF → UF_ORIGEM / UF_DESTINO) ──
-        df = renomear_colunas_duplicadas(df)
-
-        # ── Limpa colunas de texto ──
-        # FIX: .str.replace(r'\s+', ' ', regex=True) normaliza espaços internos duplos/triplos
-        # que causavam duplicação no gráfico de Posição Atual (ex: "LUFT  BARUERI" ≠ "LUFT BARUERI")
-        colunas_texto = ["STATUS", "TIPO", "POSIÇÃO ATUAL", "PLACA",
-                         "MOTORISTA", "OPERAÇÃO", "UF_ORIGEM", "UF_DESTINO", "DESTINO FINAL"]
-        for col in colunas_texto:
-            if col in df.columns:
-                df[col] = (
-                    df[col].astype(str)
-                    .str.strip()
-                    .str.upper()
-                    .str.replace(r'\s+', ' ', regex=True)  # ← normaliza espaços internos
-                )
-                # Substitui strings vazias e 'nan'/'none' por NaN real
-                df[col] = df[col].where(
-                    ~df[col].isin(["NAN", "NONE", "NAT", ""]),
-                    other=pd.NA
-                )
+def _ler_aba_streaming(file_source, aba=ABA_FROTA, projecao=None):
+    """
+    Lê o XML da aba direto do pacote .xlsx com expat (sem objetos Cell do
+    openpyxl) e devolve o mesmo DataFrame cru que
+    pd.read_excel(..., header=None) produziria.
+
+    Com `projecao`, assim que a linha de cabeçalho aparece as células das
+    colunas fora dela deixam de ser convertidas e guardadas (o expat ainda
+    as percorre, mas sem custo de Python por valor).
+    """
+    if hasattr(file_source, "seek"):
+        file_source.seek(0)
+    with zipfile.ZipFile(file_source) as pacote:
+        caminho, epoca = _localizar_aba(pacote, aba)
+        strings = _ler_strings_compartilhadas(pacote)
+        estilos_data, estilos_duracao = _ler_formatos_data(pacote)
+
+        linhas = []             # tuplas de valores por linha, já sem vazios à direita
+        largura = 0
+        vazias_seguidas = 0     # só contadas; viram linhas se algum dado vier depois
+        linha = {}              # coluna (0-based) → valor da linha corrente
+        proxima_linha = 1       # número (1-based) esperado da próxima <row>
+        proxima_coluna = 0
+        celula = None           # [coluna, tipo, estilo]
+        partes = []
+        capturando = False
+        mantidas = None         # colunas lidas, decididas no cabeçalho (None = todas)
+
+        def projetar(valores):
+            """Fixa as colunas lidas se `valores` é a linha de cabeçalho."""
+            nonlocal mantidas
+            nomes_cabecalho = [str(v).strip().upper() if v is not None else "" for v in valores]
+            if "STATUS" in nomes_cabecalho:
+                mantidas = {j for j, nome in enumerate(nomes_cabecalho) if manter_coluna(nome, projecao)}
+
+        def fechar_linha():
+            nonlocal largura, vazias_seguidas
+            if not linha:
+                vazias_seguidas += 1
+                return
+            # Linhas vazias no meio dos dados são preservadas; as do fim, descartadas
+            if vazias_seguidas:
+                linhas.extend([()] * vazias_seguidas)
+                vazias_seguidas = 0
+            n = max(linha) + 1
+            linhas.append(tuple(linha.get(j) for j in range(n)))
+            largura = max(largura, n)
+            linha.clear()
+            if projecao is not None and mantidas is None and len(linhas) <= LIMITE_BUSCA_CABECALHO:
+                projetar(linhas[-1])
+
+        nomes = _NOMES_LOCAIS
+
+        def inicio(tag, attrs):
+            nonlocal proxima_linha, proxima_coluna, celula, capturando, vazias_seguidas
+            nome = nomes[tag]
+            if nome == "c":
+                ref = attrs.get("r")
+                if ref:
+                    letras = ref.rstrip("0123456789")
+                    proxima_coluna = column_index_from_string(letras) - 1
+                if mantidas is None or proxima_coluna in mantidas:
+                    celula = [proxima_coluna, attrs.get("t", "n"), attrs.get("s")]
+                proxima_coluna += 1
+                partes.clear()
+            elif (nome == "v" or nome == "t") and celula is not None:
+                capturando = True
+            elif nome == "row":
+                numero = int(attrs.get("r", proxima_linha))
+                # <row> ausentes no XML equivalem a linhas vazias
+                if numero > proxima_linha:
+                    vazias_seguidas += numero - proxima_linha
+                proxima_linha = numero + 1
+                proxima_coluna = 0
+
+        def fim(tag):
+            nonlocal celula, capturando
+            nome = nomes[tag]
+            if nome in ("v", "t"):
+                capturando = False
+            elif nome == "c":
+                if celula is None:
+                    return   # coluna fora da projeção
+                coluna, tipo, estilo = celula
+                bruto = "".join(partes)
+                celula = None
+                if not partes and tipo != "inlineStr":
+                    return
+                if tipo == "s":
+                    valor = strings[int(bruto)]
+                elif tipo in ("str", "inlineStr"):
+                    valor = bruto
+                elif tipo == "b":
+                    valor = bool(int(bruto))
+                elif tipo == "e":
+                    valor = bruto   # códigos de erro viram NaN na conversão da coluna
+                elif tipo == "d":
+                    valor = from_ISO8601(bruto)
+                else:
+                    valor = float(bruto) if ("." in bruto or "E" in bruto or "e" in bruto) else int(bruto)
+                    if estilo is not None and int(estilo) in estilos_data:
+                        try:
+                            valor = from_excel(valor, epoca, timedelta=int(estilo) in estilos_duracao)
+                        except (OverflowError, ValueError):
+                            valor = "#VALUE!"
+                if valor is not None and valor != "":
+                    linha[coluna] = valor
+            elif nome == "row":
+                fechar_linha()
+
+        def texto(dados):
+            if capturando:
+                partes.append(dados)
+
+        # Vai até o fim do XML, como o pd.read_excel (que ignora o <dimension>)
+        with pacote.open(caminho) as xml_aba:
+            parser = expat.ParserCreate()
+            parser.buffer_text = True
+            parser.StartElementHandler = inicio
+            parser.EndElementHandler = fim
+            parser.CharacterDataHandler = texto
+            parser.ParseFile(xml_aba)
+
+    if not linhas:
+        return pd.DataFrame()
+
+    # Transpõe linha → coluna de uma vez (zip em C) e tipa cada coluna
+    preenchidas = [l + (None,) * (largura - len(l)) if len(l) < largura else l for l in linhas]
+    colunas = zip(*preenchidas)
+    return pd.DataFrame({i: _converter_coluna_excel(col) for i, col in enumerate(colunas)})
+
+def ler_aba_excel(file_source, aba=ABA_FROTA, motor=MOTOR_LEITURA_PADRAO, projecao=None):
+    """
+    Lê a aba da planilha sem cabeçalho, pelo motor escolhido. A `projecao` só
+    poupa trabalho no motor streaming; no pandas a seleção fica para a limpeza.
+    """
+    if motor == "streaming" and _eh_xlsx(file_source):
+        return _ler_aba_streaming(file_source, aba, projecao)
+    return pd.read_excel(file_source, sheet_name=aba, header=None)
+
+# =====================================================
+# LEITURA DE CSV E PARQUET (EXPORTAÇÕES DO TMS)
+# =====================================================
+# O formato vem dos primeiros bytes, não do nome: vale para upload e para o
+# arquivo monitorado. Só as pastas de trabalho do Excel têm abas.
+FORMATOS_COM_ABAS = {"xlsx", "xls"}
+
+# CSV: lido em lotes de linhas, como texto, com os mesmos marcadores de vazio
+# do Excel; o resultado é a mesma "aba crua" sem cabeçalho. Com o cabeçalho na
+# amostra, cada lote já sai compacto: as colunas categóricas codificadas pelo
+# parser e as demais de texto em string Arrow (ver _tipos_csv)
+TAMANHO_LOTE_CSV = 50_000
+AMOSTRA_CSV = 64 * 1024
+SEPARADORES_CSV = ";,\t|"
+# Exportações do Excel/TMS em pt-BR costumam vir em cp1252 quando não são UTF-8
+CODIFICACOES_CSV = ("utf-8-sig", "cp1252")
+
+
+def detectar_formato(file_source):
+    """"xlsx", "xls", "parquet" ou "csv", pela assinatura do arquivo."""
+    file_source.seek(0)
+    inicio = file_source.read(8)
+    file_source.seek(0)
+    if inicio.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    if inicio.startswith(b"\xd0\xcf\x11\xe0"):
+        return "xls"
+    if inicio.startswith(b"PAR1"):
+        return "parquet"
+    return "csv"
+
+def _dialeto_csv(amostra):
+    """
+    (codificação, separador, largura, cabeçalho) a partir do início do arquivo;
+    o cabeçalho é a primeira linha com STATUS, ou None se não estiver na amostra.
+    """
+    amostra = amostra[:amostra.rfind(b"\n") + 1] or amostra   # não corta caractere multibyte
+    for codificacao in CODIFICACOES_CSV:
+        try:
+            texto = amostra.decode(codificacao)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ErroCarregamento("❌ Não foi possível identificar a codificação do CSV.")
+    try:
+        separador = csv.Sniffer().sniff(texto, delimiters=SEPARADORES_CSV).delimiter
+    except csv.Error:
+        separador = max(SEPARADORES_CSV, key=texto.count)
+    linhas = list(csv.reader(io.StringIO(texto), delimiter=separador))
+    largura = max((len(campos) for campos in linhas), default=1)
+    cabecalho = next((campos for campos in linhas[:LIMITE_BUSCA_CABECALHO]
+                      if "STATUS" in (c.strip().upper() for c in campos)), None)
+    return codificacao, separador, largura, cabecalho
+
+def _tipos_csv(cabecalho, colunas):
+    """
+    dtype de cada coluna lida, pelo nome no cabeçalho: "category" para as que
+    viram Categorical na limpeza (as duas UF incluídas), string Arrow para as
+    demais de texto e object para o resto (o texto cru, como antes).
+    """
+    tipos = {}
+    for j in colunas:
+        nome = cabecalho[j].strip().upper() if j < len(cabecalho) else ""
+        if nome in COLUNAS_CATEGORICAS or nome == "UF":
+            tipos[j] = "category"
+        elif nome in COLUNAS_TEXTO:
+            tipos[j] = "string[pyarrow]"
+        else:
+            tipos[j] = object
+    return tipos
+
+def _juntar_lotes(lotes):
+    """
+    Concatena os lotes coluna a coluna. As categóricas são unidas pelos
+    códigos (union_categoricals): cada lote tem as suas categorias, e um
+    pd.concat as converteria para object do tamanho do arquivo inteiro.
+    """
+    colunas = {}
+    for col in lotes[0].columns:
+        partes = [lote[col] for lote in lotes]
+        if isinstance(partes[0].dtype, pd.CategoricalDtype):
+            colunas[col] = pd.Series(union_categoricals(partes, ignore_order=True))
+        else:
+            colunas[col] = pd.concat(partes, ignore_index=True)
+    return pd.DataFrame(colunas)
+
+def ler_csv(file_source, tamanho_lote=TAMANHO_LOTE_CSV, projecao=None):
+    """
+    Lê o CSV sem cabeçalho, em lotes, no mesmo formato cru de ler_aba_excel.
+    Com o cabeçalho na amostra, só as colunas da `projecao` são lidas e cada
+    lote já chega com os dtypes de _tipos_csv; sem ele, tudo como object.
+    """
+    file_source.seek(0)
+    codificacao, separador, largura, cabecalho = _dialeto_csv(file_source.read(AMOSTRA_CSV))
+    colunas = range(largura)
+    tipos = object
+    if cabecalho is not None:
+        if projecao is not None:
+            colunas = [j for j, nome in enumerate(cabecalho) if manter_coluna(nome.strip().upper(), projecao)]
+        tipos = _tipos_csv(cabecalho, colunas)
+    # a amostra pode acertar o UTF-8 e o resto do arquivo não: tenta as outras codificações
+    for codificacao in (codificacao, *(c for c in CODIFICACOES_CSV if c != codificacao)):
+        file_source.seek(0)
+        try:
+            with pd.read_csv(
+                file_source, sep=separador, encoding=codificacao, header=None,
+                names=range(largura), usecols=colunas, dtype=tipos, na_values=sorted(VALORES_NA_EXCEL),
+                keep_default_na=False, chunksize=tamanho_lote,
+            ) as lotes:
+                partes = list(lotes)   # já compactos: o pico é o dos lotes, não o de um object inteiro
+            break
+        except UnicodeDecodeError:
+            continue
+        except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            raise ErroCarregamento(f"❌ Não foi possível ler o CSV: {e}")
+    else:
+        raise ErroCarregamento("❌ Não foi possível identificar a codificação do CSV.")
+    if not partes:
+        return pd.DataFrame()
+    return _juntar_lotes(partes)
+
+def ler_parquet(file_source, projecao=PROJECAO_NUCLEO):
+    """Lê do Parquet só as colunas da `projecao` (pelo nome, strip + upper)."""
+    file_source.seek(0)
+    try:
+        arquivo = pq.ParquetFile(file_source)
+        escolhidas = [nome for nome in arquivo.schema_arrow.names
+                      if manter_coluna(str(nome).strip().upper(), projecao)]
+        return arquivo.read(columns=escolhidas, use_pandas_metadata=False).to_pandas()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise ErroCarregamento(f"❌ Não foi possível ler o Parquet: {e}")
+
+# Quantas linhas do topo da aba são examinadas atrás do cabeçalho
+LIMITE_BUSCA_CABECALHO = 100
+
+def detectar_cabecalho(df, marcador="STATUS", max_linhas=LIMITE_BUSCA_CABECALHO):
+    """
+    Posição da primeira linha, entre as `max_linhas` iniciais da aba crua
+    (lida com header=None), com uma célula de texto igual a `marcador`
+    (strip + upper); None se não houver.
+
+    O topo é convertido em blocos crescentes (8, 32, 128 linhas), então o
+    caso comum — cabeçalho nas primeiras linhas — para cedo. Cabeçalhos
+    repetidos mais abaixo são tratados em remover_cabecalhos_repetidos.
+    """
+    inicio, passo = 0, 8
+    limite = min(len(df), max_linhas)
+    while inicio < limite:
+        fim = min(inicio + passo, limite)
+        for i, linha in enumerate(df.iloc[inicio:fim].to_numpy(dtype=object), inicio):
+            for valor in linha:
+                if isinstance(valor, str) and valor.strip().upper() == marcador:
+                    return i
+        inicio, passo = fim, passo * 4
+    return None
+
+def preparar_aba(file_source, aba=ABA_FROTA, motor=MOTOR_LEITURA_PADRAO, projecao=PROJECAO_NUCLEO):
+    """
+    Lê a aba (ou o CSV/Parquet, pelo formato do arquivo) e aplica toda a
+    limpeza, sem chamar o Streamlit — roda também nos processos do pool de
+    leitura. Falhas viram exceção: ErroCarregamento (dados inválidos) ou
+    ValueError (aba não encontrada).
+
+    `projecao` escolhe as colunas: PROJECAO_NUCLEO (carregamento),
+    PROJECAO_EXTRAS (as demais, para o card) ou None. O índice do resultado é
+    a chave de cada linha — a posição dela na aba crua, que não depende da
+    projeção — e é por ele que as colunas extras se alinham ao núcleo.
+    """
+    formato = detectar_formato(file_source)
+    if formato == "parquet":
+        # Parquet já tem cabeçalho: vai direto para a limpeza
+        return limpar_tabela(ler_parquet(file_source, projecao), projecao)
+
+    # ── Lê a planilha sem assumir que a linha 0 é cabeçalho ──
+    if formato == "csv":
+        df = ler_csv(file_source, projecao=projecao)
+    else:
+        df = ler_aba_excel(file_source, aba, motor, projecao)
+
+    if df.empty:
+        raise ErroCarregamento("❌ A planilha está vazia!")
+
+    # ── Detecta dinamicamente onde está a linha de cabeçalho ──
+    # Procura a primeira linha que contenha "STATUS" (case-insensitive)
+    header_row = detectar_cabecalho(df)
+
+    # Fallback: assume linha 0 como cabeçalho
+    if header_row is None:
+        header_row = 0
 
-        # ── Remove linhas sem STATUS válido ──
-        if "STATUS" not in df.columns:
-            st.error("❌ Coluna 'STATUS' não encontrada na planilha!")
-            return pd.DataFrame()
+    df.columns = df.iloc[header_row]
+    return limpar_tabela(df[header_row + 1:], projecao)
 
-        df = df[df["STATUS"].notna() & (df["STATUS"].str.strip() != "")]
+def limpar_tabela(df, projecao=None):
+    """Da tabela já com cabeçalho ao DataFrame limpo que o dashboard usa."""
+    # ── Remove colunas completamente vazias ──
+    df = df.dropna(axis=1, how='all')
 
-        if df.empty:
-            st.error("❌ Nenhum dado válido encontrado após o processamento!")
-            return pd.DataFrame()
+    # ── Normaliza nomes de colunas (strip + upper) ──
+    df.columns = [str(c).strip().upper() if pd.notna(c) else f"COL_{i}"
+                  for i, c in enumerate(df.columns)]
 
+    # ── Renomeia colunas duplicadas (ex: UF → UF_ORIGEM / UF_DESTINO) ──
+    df = renomear_colunas_duplicadas(df)
+
+    # ── Projeção (o motor pandas e o .xls chegam aqui com todas as colunas) ──
+    if projecao == PROJECAO_NUCLEO:
+        df = df.drop(columns=[c for c in df.columns if c not in COLUNAS_TEXTO])
+    elif projecao == PROJECAO_EXTRAS:
+        df = df.drop(columns=[c for c in df.columns if c in COLUNAS_TEXTO and c != "STATUS"])
+
+    # ── Limpa colunas de texto ──
+    df = limpar_colunas_texto(df)
+
+    # ── Remove linhas sem STATUS válido ──
+    if "STATUS" not in df.columns:
+        raise ErroCarregamento("❌ Coluna 'STATUS' não encontrada na planilha!")
+
+    # Cabeçalhos repetidos mais abaixo (vários blocos na mesma aba) não são veículos
+    df = remover_cabecalhos_repetidos(df)
+
+    df = df[df["STATUS"].notna()]
+
+    if df.empty:
+        raise ErroCarregamento("❌ Nenhum dado válido encontrado após o processamento!")
+
+    if projecao == PROJECAO_EXTRAS:
+        df = df.drop(columns="STATUS")
+    return df
+
+def remover_cabecalhos_repetidos(df, marcador="STATUS"):
+    """
+    Tira as linhas de cabeçalho repetido: depois da normalização elas têm
+    `marcador` na própria coluna STATUS, então basta uma comparação sobre os
+    códigos da categoria. As categorias e as colunas que só essas linhas
+    usavam (ex.: "TIPO" na coluna TIPO, uma coluna sem nenhum dado) saem junto
+    — o resultado é o mesmo de tirar as linhas antes da limpeza. As linhas que
+    ficam mantêm o índice (a chave de linha).
+    """
+    status = df["STATUS"]
+    codigo = status.cat.categories.get_indexer([marcador])[0]
+    if codigo < 0:
         return df
+    repetidos = status.cat.codes.to_numpy() == codigo
+    for col in COLUNAS_CATEGORICAS:
+        if col not in df.columns:
+            continue
+        codigos = df[col].cat.codes.to_numpy()
+        so_cabecalho = np.setdiff1d(codigos[repetidos], codigos[~repetidos])
+        categorias = df[col].cat.categories
+        sobras = categorias[so_cabecalho[so_cabecalho >= 0]].difference(ORDEM_CATEGORIAS.get(col, []))
+        if len(sobras):
+            # set_categories, não remove_categories: este reordena as categorias
+            df[col] = df[col].cat.set_categories(categorias[~categorias.isin(sobras)])
+    return df.take(np.flatnonzero(~repetidos)).dropna(axis=1, how="all")
+
+def limpar_colunas_texto(df):
+    # FIX: espaços internos duplos/triplos são normalizados, pois causavam
+    # duplicação no gráfico de Posição Atual (ex: "LUFT  BARUERI" ≠ "LUFT BARUERI")
+    for col in COLUNAS_TEXTO:
+        if col in df.columns:
+            df[col] = normalizar_coluna_texto(
+                df[col],
+                categorica=col in COLUNAS_CATEGORICAS,
+                ordem=ORDEM_CATEGORIAS.get(col),
+            )
+    return df
 
+def load_data_from_file(file_source, motor=MOTOR_LEITURA_PADRAO):
+    try:
+        return preparar_aba(file_source, ABA_FROTA, motor)
+
+    except ErroCarregamento as e:
+        st.error(str(e))
+        return pd.DataFrame()
     except ValueError as e:
         # Aba não encontrada
         st.error(f"❌ Aba 'Frota Agro ' não encontrada. Verifique o nome da aba no Excel.")
@@ -602,37 +1328,1349 @@ def load_data_from_file(file_source):
         st.error(f"Detalhes: {traceback.format_exc()}")
         return pd.DataFrame()
 
-def aplicar_cor_status(row):
-    status = row["STATUS"]
-    # Mapa de status → (cor de fundo, cor do texto)
-    estilos = {
-        "MANUTENÇÃO":                  ("#3d1f1f", "#ff3c00"),
-        "DISPONÍVEIS NÃO TRIPULADO":   ("#1a2e1a", "#4caf50"),
-        "DISPONÍVEIS TRIPULADO":       ("#1a2e1a", "#0aec0a"),
-        "CARREGADO":                   ("#2e2010", "#ff9800"),
-        "RETORNANDO DISPONÍVEIS":      ("#101a2e", "#2196f3"),
-        "APOIO FILIAL":                ("#2e2e2e", "#ffffff"),
-        "INDISPONÍVEIS":               ("#1e2025", "#94a3b8"),
-        "FORA DE OPERAÇÃO":            ("#1a1c1f", "#64748b"),
-        "RETORNANDO INDISPONÍVEIS":    ("#1e2025", "#cbd5e1"),
+# =====================================================
+# VÁRIAS FONTES (ARQUIVOS × ABAS) EM PARALELO
+# =====================================================
+# Cada par (arquivo, aba) é lido e limpo num processo do pool: o parse é
+# CPU-bound e segura o GIL, então threads não ajudariam. 0 = um processo por núcleo.
+PROCESSOS_LEITURA = int(os.environ.get("TORRE_PROCESSOS_LEITURA", "0")) or os.cpu_count() or 1
+
+log = logging.getLogger("torre_controle")
+
+# Coluna que identifica de qual arquivo/aba veio cada veículo
+COLUNA_FONTE = "FONTE"
+
+def listar_abas(dados):
+    """
+    Nomes das abas do arquivo, na ordem da pasta de trabalho; [] para formatos
+    sem abas (CSV, Parquet) e None se não der para listar.
+    """
+    arquivo = io.BytesIO(dados)
+    if detectar_formato(arquivo) not in FORMATOS_COM_ABAS:
+        return []
+    try:
+        if _eh_xlsx(arquivo):
+            nomes = []
+            with zipfile.ZipFile(arquivo) as pacote:
+                _parse_xml(pacote.read("xl/workbook.xml"),
+                           lambda tag, attrs: _NOMES_LOCAIS[tag] == "sheet" and nomes.append(attrs.get("name")))
+            return nomes
+        return pd.ExcelFile(arquivo).sheet_names
+    except Exception:
+        return None
+
+def rotulo_fonte(nome, aba):
+    """Valor da coluna FONTE: "arquivo · aba", ou só o arquivo quando o formato não tem abas."""
+    return f"{nome} · {aba.strip()}" if aba.strip() else nome
+
+def _processar_fonte(nome, dados, aba, projecao=PROJECAO_NUCLEO, motor=MOTOR_LEITURA_PADRAO):
+    """
+    (DataFrame limpo, None) ou (None, mensagem de erro) de uma fonte. No pool
+    é chamada por leitura_fontes.processar_fonte; na leitura em sequência, direto.
+    """
+    try:
+        return preparar_aba(io.BytesIO(dados), aba, motor, projecao), None
+    except ErroCarregamento as e:
+        return None, f"{rotulo_fonte(nome, aba)}: {e}"
+    except ValueError:
+        return None, f"❌ {nome}: aba '{aba.strip()}' não encontrada."
+    except Exception as e:
+        return None, f"❌ {rotulo_fonte(nome, aba)}: erro ao carregar dados: {e}"
+
+@st.cache_resource(show_spinner=False)
+def obter_pool_leitura():
+    """
+    Pool de leitura do processo, compartilhado pelas sessões e reaproveitado
+    entre os reruns; None com um núcleo só ou se o pool não puder ser criado.
+
+    Os processos saem de um forkserver, não de um fork do servidor Streamlit
+    (multi-thread: tornado, sessões), e o forkserver já importa o
+    torre_controle, então cada processo novo nasce com o pipeline carregado.
+    """
+    if PROCESSOS_LEITURA < 2:
+        return None
+    metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    contexto = multiprocessing.get_context(metodo)
+    if metodo == "forkserver":
+        contexto.set_forkserver_preload(["torre_controle"])
+    try:
+        return ProcessPoolExecutor(max_workers=PROCESSOS_LEITURA, mp_context=contexto)
+    except (OSError, ValueError):
+        log.warning("Pool de leitura indisponível; as fontes serão lidas em sequência", exc_info=True)
+        return None
+
+def _executar_tarefas(tarefas, projecao=PROJECAO_NUCLEO):
+    """
+    Roda as tarefas no pool de leitura. Uma tarefa só, ou sem pool, roda em
+    sequência no processo atual; se o pool falhar, o motivo vai para o log e
+    a leitura é refeita em sequência.
+    """
+    pool = obter_pool_leitura() if len(tarefas) > 1 else None
+    if pool is not None:
+        try:
+            return list(pool.map(leitura_fontes.processar_fonte, *zip(*tarefas),
+                                 repeat(projecao), repeat(MOTOR_LEITURA_PADRAO)))
+        except BrokenProcessPool:
+            # um processo morreu (ex.: falta de memória): o pool não se recupera
+            log.warning("Pool de leitura quebrado; recriando e lendo as fontes em sequência", exc_info=True)
+            pool.shutdown(wait=False, cancel_futures=True)
+            obter_pool_leitura.clear()
+        except (OSError, pickle.PicklingError):
+            log.warning("Falha ao usar o pool de leitura; lendo as fontes em sequência", exc_info=True)
+    return [_processar_fonte(*tarefa, projecao) for tarefa in tarefas]
+
+def concatenar_fontes(partes):
+    """
+    Junta os DataFrames [(fonte, rótulo, df)] com a coluna FONTE. `fonte` é a
+    posição da tarefa e entra na chave de linha, que vira o par (fonte, linha).
+    As categorias de cada parte diferem, então as colunas de texto são
+    normalizadas de novo sobre o conjunto (fatorizado, o custo é só o dos
+    valores distintos).
+    """
+    rotulos = [rotulo for _, rotulo, _ in partes]
+    df = pd.concat([parte for _, _, parte in partes], keys=[fonte for fonte, _, _ in partes])
+    df[COLUNA_FONTE] = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(partes)), [len(parte) for _, _, parte in partes]), rotulos
+    )
+    return limpar_colunas_texto(df)
+
+def carregar_varias_fontes(tarefas):
+    """DataFrame único das tarefas (nome, bytes, aba); fontes com erro são avisadas e ignoradas."""
+    partes = []
+    for fonte, ((nome, _, aba), (df, erro)) in enumerate(zip(tarefas, _executar_tarefas(tarefas))):
+        if erro:
+            st.warning(erro)
+        else:
+            partes.append((fonte, rotulo_fonte(nome, aba), df))
+    if not partes:
+        st.error("❌ Nenhum dado válido encontrado nos arquivos/abas selecionados!")
+        return pd.DataFrame()
+    return concatenar_fontes(partes)
+
+def ler_colunas_extras(dados):
+    """
+    Colunas fora do núcleo de `dados` (bytes de um arquivo ou tarefas de várias
+    fontes), com a mesma chave de linha no índice que o DataFrame carregado.
+    Fontes com erro ficaram fora do núcleo e ficam fora aqui também; None se
+    nada for lido.
+    """
+    if isinstance(dados, bytes):
+        df, _ = _processar_fonte("", dados, ABA_FROTA, PROJECAO_EXTRAS)
+        return df
+    partes = {fonte: df for fonte, (df, erro) in enumerate(_executar_tarefas(dados, PROJECAO_EXTRAS))
+              if erro is None}
+    return pd.concat(partes) if partes else None
+
+# =====================================================
+# CACHE PERSISTENTE DE PLANILHAS (CHAVE = CONTEÚDO)
+# =====================================================
+# Entra no hash do conteúdo: incrementar sempre que o pipeline de
+# carregamento passar a produzir um DataFrame diferente para o mesmo arquivo.
+VERSAO_LOADER = "6"
+
+DIRETORIO_CACHE = os.environ.get(
+    "TORRE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "torre_controle_cache")
+)
+LIMITE_CACHE_MB = int(os.environ.get("TORRE_CACHE_MAX_MB", "512"))
+
+def chave_conteudo(dados):
+    """SHA-256 dos bytes do arquivo + versão do loader."""
+    h = hashlib.sha256()
+    h.update(f"torre-controle/loader-v{VERSAO_LOADER}".encode())
+    h.update(b"\0")
+    h.update(dados)
+    return h.hexdigest()
+
+# Colunas object só de texto vão como string, e o tipo de nulo que usavam
+# (None, NaN ou pd.NA — varia com o formato de origem) fica nos metadados.
+# As demais (datas, KM com int e float, células misturadas) são gravadas como
+# struct: um filho por tipo Python presente, mais o código do tipo de cada linha.
+METADADO_NULOS = b"torre:nulos"
+METADADO_OBJETOS = b"torre:objetos"
+NULOS_TEXTO = {"NoneType": None, "float": np.nan, "NAType": pd.NA}
+
+_tipo_python = np.frompyfunc(lambda v: type(v).__name__, 1, 1)
+
+def _nulo_texto(valores):
+    """
+    Nome do tipo de nulo de uma coluna object só de texto ("" se não tem
+    nulos), ou None se a coluna não é só texto ou mistura tipos de nulo.
+    """
+    nulos = pd.isna(valores)
+    if not all(isinstance(v, str) for v in valores[~nulos]):
+        return None
+    tipos = set(_tipo_python(valores[nulos]))
+    if not tipos:
+        return ""
+    tipo = tipos.pop()
+    return tipo if not tipos and tipo in NULOS_TEXTO else None
+
+def _struct_objetos(valores):
+    """(StructArray, nomes dos tipos) com os valores de uma coluna object."""
+    tipos = _tipo_python(valores).astype(str)
+    nomes, codigos = np.unique(tipos, return_inverse=True)
+    campos, filhos = ["tipo"], [pa.array(codigos.astype(np.int8))]
+    for i, nome in enumerate(nomes):
+        if nome in ("NoneType", "NAType"):
+            continue   # nulos: o código já diz qual era
+        mascara = codigos == i
+        filho = np.where(mascara, valores, None).tolist()
+        try:
+            filhos.append(pa.array(filho))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            filhos.append(pa.array([None if v is None else str(v) for v in filho]))
+        campos.append(nome)
+    return pa.StructArray.from_arrays(filhos, names=campos), nomes.tolist()
+
+def _valores_objetos(struct, nomes):
+    """Inverso de _struct_objetos: array object com os valores e tipos originais."""
+    struct = struct.combine_chunks() if isinstance(struct, pa.ChunkedArray) else struct
+    codigos = struct.field("tipo").to_numpy(zero_copy_only=False)
+    valores = np.full(len(struct), None, dtype=object)
+    for i, nome in enumerate(nomes):
+        mascara = codigos == i
+        if nome == "NAType":
+            valores[mascara] = pd.NA
+        elif nome != "NoneType":
+            valores[mascara] = np.array(struct.field(nome).to_pylist(), dtype=object)[mascara]
+    return valores
+
+def _tabela_arrow(df):
+    """
+    Converte para Arrow de forma que _dataframe_arrow devolva o mesmo
+    DataFrame (dtypes, tipos Python das colunas object e tipo dos nulos).
+    """
+    nulos, objetos = {}, {}
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        valores = df[col].to_numpy(dtype=object)
+        nulo = _nulo_texto(valores)
+        if nulo is None:
+            objetos[col] = _struct_objetos(valores)
+            df[col] = None
+        elif nulo:
+            nulos[col] = nulo
+    tabela = pa.Table.from_pandas(df, preserve_index=None)
+    for col, (struct, _) in objetos.items():
+        i = tabela.schema.get_field_index(col)
+        tabela = tabela.set_column(i, col, struct)
+    metadados = dict(tabela.schema.metadata or {})
+    metadados[METADADO_NULOS] = json.dumps(list(nulos.items())).encode()
+    metadados[METADADO_OBJETOS] = json.dumps([[col, nomes] for col, (_, nomes) in objetos.items()]).encode()
+    return tabela.replace_schema_metadata(metadados)
+
+def _dataframe_arrow(tabela):
+    """Inverso de _tabela_arrow."""
+    metadados = tabela.schema.metadata or {}
+    nulos = json.loads(metadados.get(METADADO_NULOS, b"[]"))
+    objetos = json.loads(metadados.get(METADADO_OBJETOS, b"[]"))
+    structs = {}
+    for col, nomes in objetos:
+        i = tabela.schema.get_field_index(col)
+        structs[col] = (tabela.column(i), nomes)
+        tabela = tabela.set_column(i, col, pa.nulls(len(tabela)))
+    df = tabela.to_pandas()
+    for col, (struct, nomes) in structs.items():
+        df[col] = pd.Series(_valores_objetos(struct, nomes), index=df.index, dtype=object)
+    # Arrow devolve None nos nulos de texto; volta o nulo que a coluna usava
+    for col, nulo in nulos:
+        if nulo != "NoneType":
+            df[col] = df[col].where(df[col].notna(), NULOS_TEXTO[nulo])
+    return df
+
+# Sufixos dos arquivos do cache: DataFrames, bytes de origem e listas de fontes
+SUFIXOS_CACHE = (".arrow", ".origem", ".fontes")
+
+class CachePlanilhas:
+    """
+    Cache em disco dos DataFrames já limpos, em arquivos Arrow IPC lidos
+    por memory-map, e da origem de cada planilha (para a leitura tardia das
+    colunas extras). Compartilhável entre processos/réplicas apontando
+    TORRE_CACHE_DIR para o mesmo diretório; a ordem LRU é o mtime do arquivo.
+    """
+
+    def __init__(self, diretorio=DIRETORIO_CACHE, limite_mb=LIMITE_CACHE_MB):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_mb * 1024 * 1024
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, chave, sufixo=".arrow"):
+        return os.path.join(self.diretorio, f"{chave}{sufixo}")
+
+    def ler(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            with pa.memory_map(caminho, "r") as origem:
+                tabela = pa.ipc.open_file(origem).read_all()
+            os.utime(caminho)  # marca como usado recentemente (LRU)
+        except (FileNotFoundError, pa.ArrowInvalid, OSError):
+            return None
+        return _dataframe_arrow(tabela)
+
+    def gravar(self, chave, df):
+        tabela = _tabela_arrow(df)
+
+        def escrever(destino):
+            with pa.ipc.new_file(destino, tabela.schema) as escritor:
+                escritor.write_table(tabela)
+
+        self._gravar_arquivo(self._caminho(chave), escrever)
+        self._podar()
+
+    def _gravar_arquivo(self, caminho, escrever):
+        # Grava em arquivo temporário + rename atômico: leitores nunca veem arquivo pela metade
+        fd, temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as destino:
+                escrever(destino)
+            os.replace(temporario, caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def _ler_arquivo(self, caminho):
+        try:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+            os.utime(caminho)
+        except OSError:
+            return None
+        return dados
+
+    def gravar_origem(self, chave, dados):
+        """
+        Guarda a origem da planilha `chave`: os bytes de um arquivo ou as
+        tarefas (nome, bytes, aba) de várias fontes. Cada arquivo vai uma vez
+        só, pela própria chave de conteúdo; as várias fontes gravam a lista
+        que aponta para eles. Já gravada, só marca o uso (LRU).
+        """
+        if isinstance(dados, bytes):
+            arquivos, fontes = {chave: dados}, None
+        else:
+            arquivos, fontes = {}, []
+            for nome, dados_arquivo, aba in dados:
+                chave_arquivo = chave_conteudo(dados_arquivo)
+                arquivos[chave_arquivo] = dados_arquivo
+                fontes.append([nome, chave_arquivo, aba])
+        for chave_arquivo, dados_arquivo in arquivos.items():
+            caminho = self._caminho(chave_arquivo, ".origem")
+            try:
+                os.utime(caminho)
+            except FileNotFoundError:
+                self._gravar_arquivo(caminho, lambda destino: destino.write(dados_arquivo))
+        if fontes is not None:
+            conteudo = json.dumps(fontes).encode()
+            self._gravar_arquivo(self._caminho(chave, ".fontes"), lambda destino: destino.write(conteudo))
+        self._podar()
+
+    def ler_origem(self, chave):
+        """Inverso de gravar_origem; None se algum arquivo já saiu do cache."""
+        dados = self._ler_arquivo(self._caminho(chave, ".origem"))
+        if dados is not None:
+            return dados
+        lista = self._ler_arquivo(self._caminho(chave, ".fontes"))
+        if lista is None:
+            return None
+        tarefas = []
+        for nome, chave_arquivo, aba in json.loads(lista):
+            dados = self._ler_arquivo(self._caminho(chave_arquivo, ".origem"))
+            if dados is None:
+                return None
+            tarefas.append((nome, dados, aba))
+        return tarefas
+
+    def remover(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+
+    def _podar(self):
+        """Remove os arquivos menos usados até caber no limite de tamanho."""
+        arquivos = []
+        for entrada in os.scandir(self.diretorio):
+            if entrada.name.endswith(SUFIXOS_CACHE):
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.limite_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+@st.cache_resource(show_spinner=False)
+def obter_cache_planilhas():
+    return CachePlanilhas()
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def obter_dados_planilha(chave, _dados):
+    """
+    DataFrame limpo do arquivo identificado por `chave`: memória do processo
+    → cache em disco → parse. `_dados` são os bytes de um arquivo (aba padrão)
+    ou a lista de tarefas (nome, bytes, aba) de várias fontes. O objeto é
+    compartilhado entre as sessões e não deve ser alterado.
+    """
+    cache = obter_cache_planilhas()
+    df = cache.ler(chave)
+    if df is None:
+        if isinstance(_dados, bytes):
+            df = load_data_from_file(io.BytesIO(_dados))
+        else:
+            df = carregar_varias_fontes(_dados)
+        if not df.empty:
+            try:
+                cache.gravar(chave, df)
+            except OSError:
+                pass  # sem disco para o cache: segue só com a memória
+    if not df.empty:
+        try:
+            cache.gravar_origem(chave, _dados)
+        except OSError:
+            pass  # sem a origem o card só não mostra as colunas extras
+        try:
+            obter_historico().registrar(chave, df)
+        except (OSError, sqlite3.Error):
+            pass  # histórico é auxiliar: o dashboard segue sem ele
+    return df
+
+def carregar_planilha(uploaded_file):
+    """Devolve (chave do conteúdo, DataFrame limpo) de um arquivo enviado."""
+    dados = uploaded_file.getvalue()
+    chave = chave_conteudo(dados)
+    return chave, obter_dados_planilha(chave, dados)
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def obter_abas(chave, _dados):
+    return listar_abas(_dados)
+
+def carregar_fontes(arquivos, abas):
+    """
+    (chave, DataFrame) de um ou mais arquivos enviados, lendo as `abas` de
+    cada um. Um único arquivo só com a aba padrão segue o caminho de sempre
+    (mesma chave de cache); o resto vira uma tarefa por arquivo × aba presente.
+    """
+    if len(arquivos) == 1 and list(abas) == [ABA_FROTA]:
+        return carregar_planilha(arquivos[0])
+
+    fontes = [(arquivo.name, arquivo.getvalue()) for arquivo in arquivos]
+    tarefas, partes_chave = [], []
+    for nome, dados in fontes:
+        chave_arquivo = chave_conteudo(dados)
+        existentes = obter_abas(chave_arquivo, dados)
+        # CSV/Parquet: uma tarefa só, sem aba; sem a lista de abas (ex.: .xls
+        # sem leitor) tenta todas as escolhidas
+        for aba in abas if existentes != [] else [""]:
+            if existentes is None or existentes == [] or aba in existentes:
+                tarefas.append((nome, dados, aba))
+                partes_chave.append(f"{chave_arquivo}\0{nome}\0{aba}")
+    if not tarefas:
+        st.warning("⚠️ Nenhuma das abas selecionadas existe nos arquivos enviados.")
+        return None, pd.DataFrame()
+    chave = chave_conteudo("\n".join(partes_chave).encode())
+    return chave, obter_dados_planilha(chave, tarefas)
+
+def invalidar_planilha(chave):
+    """
+    Descarta só a planilha `chave` — DataFrame em memória, cópia em disco e
+    índices derivados — para que o próximo acesso refaça o parse. As demais
+    planilhas em cache continuam intactas.
+    """
+    obter_cache_planilhas().remover(chave)
+    obter_cache_planilhas().remover(chave_extras(chave))
+    for funcao in (obter_dados_planilha, obter_indice_filtros,
+                   obter_indice_busca, obter_indice_placas, obter_cubo_frota):
+        funcao.clear(chave, None)
+    obter_colunas_extras.clear(chave)
+
+# ── Colunas fora do núcleo, lidas sob demanda ──
+# O carregamento guarda só o núcleo (COLUNAS_NUCLEO) e deixa a origem no cache
+# em disco. As demais colunas saem de uma segunda leitura dessa origem, com
+# PROJECAO_EXTRAS, feita na primeira vez que alguém abre o card de um veículo
+# daquela planilha; o resultado fica em memória e em disco.
+def chave_extras(chave):
+    return f"{chave}-extras"
+
+@st.cache_resource(show_spinner="📥 Carregando os demais campos da planilha...", max_entries=8)
+def obter_colunas_extras(chave):
+    """
+    Colunas extras da planilha `chave`, com a chave de linha do núcleo no
+    índice: memória → cache em disco → leitura da origem guardada no cache.
+    None se a origem já saiu do cache ou se nada pôde ser lido.
+    """
+    cache = obter_cache_planilhas()
+    extras = cache.ler(chave_extras(chave))
+    if extras is None:
+        dados = cache.ler_origem(chave)
+        if dados is None:
+            return None
+        extras = ler_colunas_extras(dados)
+        if extras is not None:
+            try:
+                cache.gravar(chave_extras(chave), extras)
+            except OSError:
+                pass
+    return extras
+
+# =====================================================
+# FONTE MONITORADA (PLANILHA NUM CAMINHO FIXO)
+# =====================================================
+# Caminho da planilha que os despachantes sobrescrevem no drive compartilhado
+# (vazio = só upload) e intervalo, em segundos, em que cada sessão aberta
+# confere se ela mudou
+ARQUIVO_MONITORADO = os.environ.get("TORRE_ARQUIVO_FROTA", "")
+INTERVALO_MONITORAMENTO_S = float(os.environ.get("TORRE_INTERVALO_MONITORAMENTO", "60"))
+
+# Arquivo modificado há menos que isso provavelmente ainda está sendo gravado
+ESPERA_GRAVACAO_S = 2.0
+
+class ArquivoMonitorado:
+    """
+    Planilha num caminho fixo, compartilhada entre as sessões. Cada consulta
+    faz só um stat() (mtime + tamanho); o arquivo é relido e re-hasheado
+    apenas quando essa assinatura muda, e o parse continua no
+    obter_dados_planilha, pela chave do conteúdo. Uma cópia pela metade
+    (recém-modificada ou com o zip inválido) é ignorada até a próxima
+    verificação, mantendo a versão anterior.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.assinatura = None      # (mtime_ns, tamanho) da versão aceita
+        self.chave = None
+        self.dados = None
+        self.modificado_em = None
+        self._trava = threading.Lock()
+
+    def verificar(self):
+        """(chave, bytes) da versão atual, relendo o arquivo só se ele mudou; (None, None) se nunca foi lido."""
+        try:
+            info = os.stat(self.caminho)
+        except OSError:
+            return self.chave, self.dados
+        assinatura = (info.st_mtime_ns, info.st_size)
+        with self._trava:
+            if assinatura == self.assinatura:
+                return self.chave, self.dados
+            if self.chave is not None and time.time() - info.st_mtime < ESPERA_GRAVACAO_S:
+                return self.chave, self.dados
+            try:
+                with open(self.caminho, "rb") as f:
+                    dados = f.read()
+            except OSError:
+                return self.chave, self.dados
+            if self.caminho.lower().endswith(".xlsx") and not zipfile.is_zipfile(io.BytesIO(dados)):
+                return self.chave, self.dados
+            self.assinatura = assinatura
+            self.chave, self.dados = chave_conteudo(dados), dados
+            self.modificado_em = datetime.fromtimestamp(info.st_mtime)
+            return self.chave, self.dados
+
+    def esquecer(self):
+        """Força a releitura do arquivo na próxima verificação."""
+        with self._trava:
+            self.assinatura = None
+
+@st.cache_resource(show_spinner=False)
+def obter_arquivo_monitorado(caminho):
+    return ArquivoMonitorado(caminho)
+
+def carregar_arquivo_monitorado():
+    """Devolve (chave do conteúdo, DataFrame limpo) da planilha monitorada."""
+    chave, dados = obter_arquivo_monitorado(ARQUIVO_MONITORADO).verificar()
+    if chave is None:
+        return None, pd.DataFrame()
+    return chave, obter_dados_planilha(chave, dados)
+
+@st.fragment(run_every=INTERVALO_MONITORAMENTO_S)
+def vigiar_arquivo_monitorado(chave_exibida):
+    """
+    Reexecutado sozinho a cada INTERVALO_MONITORAMENTO_S em todas as sessões
+    abertas; quando a planilha do disco não é mais a exibida, recarrega a página.
+    """
+    monitor = obter_arquivo_monitorado(ARQUIVO_MONITORADO)
+    chave, _ = monitor.verificar()
+    if chave is not None and chave != chave_exibida:
+        st.rerun()
+    if monitor.modificado_em is not None:
+        st.caption(f"🟢 Monitorando `{os.path.basename(monitor.caminho)}` · "
+                   f"versão de {monitor.modificado_em:%d/%m/%Y %H:%M:%S}")
+
+# =====================================================
+# HISTÓRICO DE SNAPSHOTS (SQLITE, CATEGORIAS EM CÓDIGOS)
+# =====================================================
+ARQUIVO_HISTORICO = os.environ.get(
+    "TORRE_HISTORICO_DB", os.path.join(DIRETORIO_CACHE, "historico.sqlite3")
+)
+# coluna do DataFrame → coluna (código inteiro) da tabela de veículos
+COLUNAS_HISTORICO = {
+    "PLACA":         "placa",
+    "STATUS":        "status",
+    "POSIÇÃO ATUAL": "posicao",
+    "UF_ORIGEM":     "uf_origem",
+    "UF_DESTINO":    "uf_destino",
+}
+
+_ESQUEMA_HISTORICO = """
+CREATE TABLE IF NOT EXISTS categorias (
+    id INTEGER PRIMARY KEY,
+    dimensao TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    UNIQUE (dimensao, valor)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    chave TEXT NOT NULL UNIQUE,
+    momento REAL NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS veiculos (
+    snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    placa INTEGER, status INTEGER, posicao INTEGER, uf_origem INTEGER, uf_destino INTEGER
+);
+CREATE INDEX IF NOT EXISTS veiculos_snapshot ON veiculos (snapshot);
+CREATE TABLE IF NOT EXISTS contagens_status (
+    snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    status INTEGER NOT NULL,
+    quantidade INTEGER NOT NULL,
+    PRIMARY KEY (snapshot, status)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS snapshots_momento ON snapshots (momento);
+"""
+
+class HistoricoFrota:
+    """
+    Histórico só de inclusão das cargas processadas, num SQLite local. Cada
+    planilha (pela chave do conteúdo) vira um snapshot com uma linha por
+    veículo em que PLACA, STATUS, POSIÇÃO e UFs são códigos inteiros de um
+    dicionário (`categorias`), mais a contagem por STATUS já somada — as
+    séries temporais leem só essa tabela pequena, sem reabrir Excel antigo.
+    """
+
+    def __init__(self, caminho=ARQUIVO_HISTORICO):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self.caminho = caminho
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.executescript(_ESQUEMA_HISTORICO)
+        self._codigos = {}    # (dimensão, valor) → id
+        self._trava = threading.Lock()
+
+    def _codificar(self, dimensao, valores, pendentes):
+        """
+        Ids (criando os que faltam) dos valores de uma dimensão. Os ids lidos
+        dentro da transação vão para `pendentes`, não para o cache: só valem
+        depois do commit.
+        """
+        conhecidos = lambda v: self._codigos.get((dimensao, v), pendentes.get((dimensao, v)))
+        novos = [(dimensao, v) for v in valores if conhecidos(v) is None]
+        if novos:
+            self._conexao.executemany(
+                "INSERT OR IGNORE INTO categorias (dimensao, valor) VALUES (?, ?)", novos)
+            for valor, id_ in self._conexao.execute(
+                    "SELECT valor, id FROM categorias WHERE dimensao = ?", (dimensao,)):
+                pendentes[(dimensao, valor)] = id_
+        return [conhecidos(v) for v in valores]
+
+    def registrar(self, chave, df, momento=None):
+        """
+        Grava o snapshot da planilha `chave` no `momento` (segundos desde a
+        época, datetime ou str; padrão: agora); devolve False se ela já estava
+        no histórico.
+        """
+        momento = time.time() if momento is None else self._epoch(momento)
+        pendentes = {}
+        with self._trava:
+            with self._conexao:
+                if self._conexao.execute("SELECT 1 FROM snapshots WHERE chave = ?", (chave,)).fetchone():
+                    return False
+                self._gravar_snapshot(chave, df, momento, pendentes)
+            # Commit feito: os ids novos de `categorias` agora existem de fato
+            self._codigos.update(pendentes)
+        return True
+
+    def _gravar_snapshot(self, chave, df, momento, pendentes):
+        colunas_codigo = {}
+        for col, destino in COLUNAS_HISTORICO.items():
+            if col not in df.columns:
+                colunas_codigo[destino] = [None] * len(df)
+                continue
+            codigos, unicos = pd.factorize(df[col])
+            ids = np.array(self._codificar(col, [str(v) for v in unicos], pendentes) + [None], dtype=object)
+            colunas_codigo[destino] = ids[codigos].tolist()   # código -1 (vazio) → None
+        snapshot = self._conexao.execute(
+            "INSERT INTO snapshots (chave, momento, total) VALUES (?, ?, ?)",
+            (chave, momento, len(df))).lastrowid
+        self._conexao.executemany(
+            f"INSERT INTO veiculos (snapshot, {', '.join(colunas_codigo)}) "
+            f"VALUES (?{', ?' * len(colunas_codigo)})",
+            zip([snapshot] * len(df), *colunas_codigo.values()))
+        self._conexao.execute(
+            "INSERT INTO contagens_status (snapshot, status, quantidade) "
+            "SELECT snapshot, status, COUNT(*) FROM veiculos "
+            "WHERE snapshot = ? AND status IS NOT NULL GROUP BY status", (snapshot,))
+
+    @staticmethod
+    def _epoch(momento):
+        """
+        Segundos desde a época, como registrar grava: números (time.time())
+        passam direto; datetime/str são hora local, como o resto do app.
+        """
+        if isinstance(momento, (int, float, np.integer, np.floating)) and not isinstance(momento, bool):
+            return float(momento)
+        return pd.Timestamp(momento).to_pydatetime().timestamp()
+
+    @staticmethod
+    def _janela(inicio, fim):
+        """Cláusula WHERE e parâmetros para snapshots entre `inicio` e `fim` (como em _epoch, ou None)."""
+        condicoes, parametros = [], []
+        if inicio is not None:
+            condicoes.append("s.momento >= ?")
+            parametros.append(HistoricoFrota._epoch(inicio))
+        if fim is not None:
+            condicoes.append("s.momento <= ?")
+            parametros.append(HistoricoFrota._epoch(fim))
+        return (" WHERE " + " AND ".join(condicoes)) if condicoes else "", parametros
+
+    def serie_status(self, inicio=None, fim=None):
+        """Quantidade de veículos por STATUS em cada snapshot da janela (linhas = MOMENTO)."""
+        where, parametros = self._janela(inicio, fim)
+        with self._trava:
+            linhas = self._conexao.execute(
+                "SELECT s.momento, c.valor, q.quantidade FROM snapshots s "
+                "JOIN contagens_status q ON q.snapshot = s.id "
+                "JOIN categorias c ON c.id = q.status" + where, parametros).fetchall()
+        if not linhas:
+            return pd.DataFrame(columns=ORDEM_STATUS, index=pd.DatetimeIndex([], name="MOMENTO"))
+        longa = pd.DataFrame(linhas, columns=["MOMENTO", "STATUS", "QUANTIDADE"])
+        longa["MOMENTO"] = pd.to_datetime(longa["MOMENTO"].map(datetime.fromtimestamp))
+        serie = longa.pivot_table(index="MOMENTO", columns="STATUS", values="QUANTIDADE",
+                                  aggfunc="sum", fill_value=0)
+        ordem = [s for s in ORDEM_STATUS if s in serie.columns] + [s for s in serie.columns if s not in ORDEM_STATUS]
+        return serie[ordem].rename_axis(columns=None)
+
+    def serie_disponibilidade(self, inicio=None, fim=None, status_considerados=STATUS_OFICIAIS):
+        """
+        TOTAL, MANUTENÇÃO e TAXA_DISPONIBILIDADE (%) por snapshot, com a mesma
+        conta do header (veículos fora de manutenção / total), considerando
+        só `status_considerados` — por padrão os status oficiais, como o sidebar.
+        """
+        serie = self.serie_status(inicio, fim)
+        considerados = serie[[s for s in status_considerados if s in serie.columns]]
+        total = considerados.sum(axis=1)
+        manutencao = considerados[[s for s in STATUS_MANUTENCAO if s in considerados.columns]].sum(axis=1)
+        taxa = ((total - manutencao) / total.where(total > 0) * 100).fillna(0.0)
+        return pd.DataFrame({"TOTAL": total, "MANUTENÇÃO": manutencao, "TAXA_DISPONIBILIDADE": taxa})
+
+    def frota_em(self, momento):
+        """Veículos (valores decodificados) do último snapshot até `momento` (como em _epoch)."""
+        with self._trava:
+            linha = self._conexao.execute(
+                "SELECT id FROM snapshots WHERE momento <= ? ORDER BY momento DESC LIMIT 1",
+                (self._epoch(momento),)).fetchone()
+            if linha is None:
+                return pd.DataFrame(columns=list(COLUNAS_HISTORICO))
+            juncoes = " ".join(f"LEFT JOIN categorias c_{destino} ON c_{destino}.id = v.{destino}"
+                               for destino in COLUNAS_HISTORICO.values())
+            campos = ", ".join(f"c_{destino}.valor" for destino in COLUNAS_HISTORICO.values())
+            linhas = self._conexao.execute(
+                f"SELECT {campos} FROM veiculos v {juncoes} WHERE v.snapshot = ?", linha).fetchall()
+        return pd.DataFrame(linhas, columns=list(COLUNAS_HISTORICO))
+
+@st.cache_resource(show_spinner=False)
+def obter_historico():
+    return HistoricoFrota()
+
+# =====================================================
+# ÍNDICE DE FILTROS (MÁSCARAS PRÉ-CALCULADAS POR VALOR)
+# =====================================================
+DIMENSOES_FILTRO = ["STATUS", "TIPO", "POSIÇÃO ATUAL", "UF_ORIGEM"]
+
+class IndiceFiltros:
+    """
+    Máscara booleana de cada valor das dimensões filtráveis do sidebar,
+    montada uma vez por planilha. Filtrar vira OR das máscaras dentro da
+    dimensão e AND entre dimensões, sem reler nem copiar o DataFrame.
+    """
+
+    def __init__(self, df, dimensoes=DIMENSOES_FILTRO):
+        self.n_linhas = len(df)
+        self.mascaras = {}      # dimensão → {valor: máscara}
+        self.preenchidas = {}   # dimensão → máscara das linhas com valor (não nulo)
+        for dim in dimensoes:
+            if dim not in df.columns:
+                continue
+            coluna = df[dim]
+            if not isinstance(coluna.dtype, pd.CategoricalDtype):
+                coluna = coluna.astype("category")
+            codigos = coluna.cat.codes.to_numpy()
+            contagens = np.bincount(codigos[codigos >= 0], minlength=len(coluna.cat.categories))
+            self.mascaras[dim] = {
+                valor: codigos == k
+                for k, valor in enumerate(coluna.cat.categories) if contagens[k]
+            }
+            self.preenchidas[dim] = codigos >= 0
+
+    def valores(self, dim, base=None):
+        """Valores da dimensão com ao menos uma linha (dentro de `base`, se informada)."""
+        por_valor = self.mascaras.get(dim, {})
+        if base is None:
+            return list(por_valor)
+        return [valor for valor, mascara in por_valor.items() if np.any(mascara & base)]
+
+    def mascara(self, dim, valores):
+        """OR das máscaras dos valores escolhidos da dimensão."""
+        por_valor = self.mascaras.get(dim, {})
+        escolhidos = set(valores)
+        resultado = np.zeros(self.n_linhas, dtype=bool)
+        if por_valor and len(escolhidos) > len(por_valor) // 2:
+            # Seleção grande (o padrão do sidebar é "tudo"): sai mais barato
+            # negar o OR dos poucos valores que ficaram de fora
+            for valor, mascara in por_valor.items():
+                if valor not in escolhidos:
+                    resultado |= mascara
+            return ~resultado & self.preenchidas[dim]
+        for valor in escolhidos:
+            if valor in por_valor:
+                resultado |= por_valor[valor]
+        return resultado
+
+    def filtrar(self, selecao, base=None):
+        """AND entre as dimensões de `selecao` ({dimensão: valores escolhidos})."""
+        resultado = np.ones(self.n_linhas, dtype=bool) if base is None else base.copy()
+        for dim, valores in selecao.items():
+            resultado &= self.mascara(dim, valores)
+        return resultado
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def obter_indice_filtros(chave, _df):
+    return IndiceFiltros(_df)
+
+# =====================================================
+# ÍNDICE DE BUSCA (N-GRAMAS SOBRE OS VALORES ÚNICOS)
+# =====================================================
+COLUNAS_BUSCA = ["PLACA", "MOTORISTA", "POSIÇÃO ATUAL", "DESTINO FINAL"]
+TAMANHO_NGRAMA = 3
+_SEM_IDS = np.empty(0, dtype=np.int32)
+
+def dobrar_acentos(texto):
+    """Maiúsculas e sem acentos: 'São José ' → 'SAO JOSE'."""
+    decomposto = unicodedata.normalize("NFKD", str(texto))
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).upper().strip()
+
+def _ngramas(texto, n=TAMANHO_NGRAMA):
+    """Todos os trechos de 1 até n caracteres do texto."""
+    return {texto[i:i + k] for k in range(1, n + 1) for i in range(len(texto) - k + 1)}
+
+class IndiceBusca:
+    """
+    Índice da "Busca rápida" do detalhamento dos KPIs, montado uma vez por
+    planilha. Cada coluna buscável é fatorada em valores únicos (já em
+    maiúsculas e sem acento) e cada n-grama de 1 a 3 letras aponta para os
+    únicos que o contêm. Uma consulta curta é um único lookup; uma longa
+    intersecta as listas dos seus trigramas e confirma o trecho só nos
+    candidatos. A volta para as linhas é um gather nos códigos da coluna.
+    """
+
+    def __init__(self, df, colunas=COLUNAS_BUSCA):
+        self.n_linhas = len(df)
+        self.colunas = {}   # coluna → (códigos por linha, textos únicos, n-grama → ids dos únicos)
+        for col in colunas:
+            if col not in df.columns:
+                continue
+            codigos, unicos = pd.factorize(df[col])
+            textos = [dobrar_acentos(valor) for valor in unicos]
+            listas = {}
+            for i, texto in enumerate(textos):
+                for grama in _ngramas(texto):
+                    listas.setdefault(grama, []).append(i)
+            self.colunas[col] = (
+                codigos,
+                textos,
+                {grama: np.array(ids, dtype=np.int32) for grama, ids in listas.items()},
+            )
+
+    @staticmethod
+    def _ids_com_trecho(trecho, textos, listas):
+        """Ids dos valores únicos que contêm `trecho` (já dobrado)."""
+        if len(trecho) <= TAMANHO_NGRAMA:
+            return listas.get(trecho, _SEM_IDS)
+        trigramas = [listas.get(trecho[i:i + TAMANHO_NGRAMA])
+                     for i in range(len(trecho) - TAMANHO_NGRAMA + 1)]
+        if any(ids is None for ids in trigramas):
+            return _SEM_IDS
+        trigramas.sort(key=len)
+        candidatos = trigramas[0]
+        for ids in trigramas[1:]:
+            if not len(candidatos):
+                break
+            candidatos = np.intersect1d(candidatos, ids, assume_unique=True)
+        return [i for i in candidatos if trecho in textos[i]]
+
+    def mascara(self, consulta):
+        """Linhas em que alguma coluna buscável contém `consulta` (sem diferenciar acento/caixa)."""
+        trecho = dobrar_acentos(consulta)
+        if not trecho:
+            return np.ones(self.n_linhas, dtype=bool)
+        resultado = np.zeros(self.n_linhas, dtype=bool)
+        for codigos, textos, listas in self.colunas.values():
+            ids = self._ids_com_trecho(trecho, textos, listas)
+            if not len(ids):
+                continue
+            # posição extra no fim: código -1 (vazio) cai nela e nunca casa
+            acertos = np.zeros(len(textos) + 1, dtype=bool)
+            acertos[ids] = True
+            resultado |= acertos[codigos]
+        return resultado
+
+    def buscar(self, consulta, posicoes=None):
+        """Como `mascara`, restrita às linhas `posicoes` da base (ex.: as de um KPI)."""
+        mascara = self.mascara(consulta)
+        return mascara if posicoes is None else mascara[posicoes]
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def obter_indice_busca(chave, _df):
+    return IndiceBusca(_df)
+
+# =====================================================
+# ÍNDICE DE PLACAS (PLACA → POSIÇÕES NA BASE)
+# =====================================================
+def normalizar_placa(valor):
+    """'abc-1d23 ' → 'ABC1D23': só letras e dígitos, em maiúsculas e sem acento."""
+    return "".join(c for c in dobrar_acentos(valor) if c.isalnum())
+
+def placas_por_linha(df):
+    """Placa normalizada de cada linha ("" nas linhas sem placa)."""
+    if "PLACA" not in df.columns:
+        return np.full(len(df), "", dtype=object)
+    codigos, unicos = pd.factorize(df["PLACA"])
+    # normaliza só os únicos; "" no fim recebe as linhas sem placa (código -1).
+    # O caso comum (ASCII, só letras maiúsculas e dígitos) já está normalizado.
+    normalizadas = np.array(
+        [v if isinstance(v, str) and v.isascii() and v.isalnum() and v == v.upper() else normalizar_placa(v)
+         for v in unicos] + [""], dtype=object)
+    return normalizadas[codigos]
+
+class IndicePlacas:
+    """
+    Posições de cada placa normalizada na base, montado uma vez por planilha.
+    A planilha às vezes repete a mesma placa em mais de uma linha; essas
+    ficam em `duplicadas`.
+    """
+
+    def __init__(self, df):
+        self.posicoes = {}   # placa normalizada → posições (int32) na base
+        self.por_linha = placas_por_linha(df)   # placa normalizada de cada linha
+        if "PLACA" in df.columns:
+            grupos = pd.Series(self.por_linha).groupby(self.por_linha, sort=False).indices
+            self.posicoes = {placa: pos.astype(np.int32) for placa, pos in grupos.items() if placa}
+        self.duplicadas = frozenset(p for p, pos in self.posicoes.items() if len(pos) > 1)
+
+    def localizar(self, placa, posicoes=None):
+        """
+        Posições da placa na base; com `posicoes` (ordenadas, ex.: as de um KPI),
+        devolve os índices dentro desse subconjunto.
+        """
+        na_base = self.posicoes.get(normalizar_placa(placa), _SEM_IDS)
+        if posicoes is None:
+            return na_base
+        k = np.searchsorted(posicoes, na_base)
+        dentro = k < len(posicoes)
+        k, na_base = k[dentro], na_base[dentro]
+        return k[posicoes[k] == na_base]
+
+    def eh_duplicada(self, placa):
+        return normalizar_placa(placa) in self.duplicadas
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def obter_indice_placas(chave, _df):
+    return IndicePlacas(_df)
+
+# =====================================================
+# DIFERENÇA ENTRE SNAPSHOTS (PLANILHA ANTERIOR × ATUAL)
+# =====================================================
+COLUNAS_DIFERENCA = ["STATUS", "POSIÇÃO ATUAL", "UF_ORIGEM", "DESTINO FINAL", "UF_DESTINO", "MOTORISTA"]
+
+@dataclass(frozen=True)
+class DiferencaFrota:
+    """O que mudou, por placa, entre duas versões da planilha."""
+    entradas: pd.DataFrame        # veículos que só existem na atual
+    saidas: pd.DataFrame          # veículos que só existiam na anterior
+    transicoes: pd.DataFrame      # PLACA, STATUS_ANTES, STATUS_DEPOIS
+    alteracoes: pd.DataFrame      # PLACA, COLUNA, ANTES, DEPOIS (todas as colunas acompanhadas)
+
+    @property
+    def vazia(self):
+        return self.entradas.empty and self.saidas.empty and self.alteracoes.empty
+
+def _primeira_posicao(codigos, n_codigos):
+    """Posição da primeira linha de cada código (-1 se o código não aparece)."""
+    posicoes = np.full(n_codigos, -1, dtype=np.int64)
+    unicos, primeiras = np.unique(codigos, return_index=True)
+    posicoes[unicos] = primeiras
+    return posicoes
+
+def _codigos_comuns(df_anterior, df_atual, col, pos_a, pos_d):
+    """
+    Códigos da coluna nas linhas `pos_a` da anterior e `pos_d` da atual, numa
+    numeração comum aos dois lados (-1 = vazio), e o valor de cada código.
+    Categóricas nos dois lados comparam os próprios códigos, depois de casar
+    as categorias; as demais colunas são fatoradas juntas só nessas linhas.
+    """
+    antes = df_anterior[col] if col in df_anterior.columns else None
+    depois = df_atual[col] if col in df_atual.columns else None
+    if isinstance(getattr(antes, "dtype", None), pd.CategoricalDtype) and \
+            isinstance(getattr(depois, "dtype", None), pd.CategoricalDtype):
+        categorias, categorias_antes = depois.cat.categories, antes.cat.categories
+        mapa = categorias.get_indexer(categorias_antes)
+        faltam = mapa < 0
+        mapa[faltam] = len(categorias) + np.arange(faltam.sum())
+        valores = np.concatenate([categorias.to_numpy(dtype=object),
+                                  categorias_antes[faltam].to_numpy(dtype=object)])
+        codigos_antes = np.append(mapa, -1)[antes.cat.codes.to_numpy()[pos_a]]
+        return codigos_antes, depois.cat.codes.to_numpy()[pos_d].astype(np.intp), valores
+    lados = [serie.to_numpy(dtype=object)[pos] if serie is not None else np.full(len(pos), None, dtype=object)
+             for serie, pos in ((antes, pos_a), (depois, pos_d))]
+    codigos, valores = pd.factorize(np.concatenate(lados))
+    return codigos[:len(pos_a)], codigos[len(pos_a):], np.asarray(valores, dtype=object)
+
+def comparar_snapshots(df_anterior, df_atual, colunas=COLUNAS_DIFERENCA,
+                       placas_anterior=None, placas_atual=None):
+    """
+    Entradas, saídas e mudanças de cada coluna acompanhada entre duas versões.
+    A junção por PLACA é feita sobre códigos: as placas normalizadas das duas
+    versões são fatoradas juntas e cada código aponta para a sua (primeira)
+    linha em cada lado. `placas_*` são as placas normalizadas por linha
+    (IndicePlacas.por_linha), já calculadas por planilha.
+    """
+    if placas_anterior is None:
+        placas_anterior = placas_por_linha(df_anterior)
+    if placas_atual is None:
+        placas_atual = placas_por_linha(df_atual)
+    codigos, unicos = pd.factorize(np.concatenate([placas_anterior, placas_atual]))
+    n_anterior = len(placas_anterior)
+    pos_antes = _primeira_posicao(codigos[:n_anterior], len(unicos))
+    pos_depois = _primeira_posicao(codigos[n_anterior:], len(unicos))
+    com_placa = unicos != ""
+    no_antes, no_depois = (pos_antes >= 0) & com_placa, (pos_depois >= 0) & com_placa
+
+    colunas_saida = ["PLACA"] + [c for c in colunas if c in df_atual.columns]
+    pos_entradas = np.sort(pos_depois[no_depois & ~no_antes])
+    pos_saidas = np.sort(pos_antes[no_antes & ~no_depois])
+    entradas = df_atual.take(pos_entradas)[colunas_saida].reset_index(drop=True)
+    saidas = df_anterior.take(pos_saidas)[[c for c in colunas_saida if c in df_anterior.columns]].reset_index(drop=True)
+
+    # veículos presentes nas duas versões, na ordem da planilha atual
+    ambos = no_antes & no_depois
+    ordem = np.argsort(pos_depois[ambos], kind="stable")
+    pos_a, pos_d = pos_antes[ambos][ordem], pos_depois[ambos][ordem]
+    placas = df_atual["PLACA"].to_numpy(dtype=object)[pos_d]
+    alteracoes = []
+    for col in colunas:
+        antes, depois, valores = _codigos_comuns(df_anterior, df_atual, col, pos_a, pos_d)
+        mudou = antes != depois
+        if not mudou.any():
+            continue
+        valores = np.append(valores, None)   # código -1 (vazio) → None
+        alteracoes.append(pd.DataFrame({
+            "PLACA": placas[mudou], "COLUNA": col,
+            "ANTES": valores[antes[mudou]], "DEPOIS": valores[depois[mudou]],
+        }))
+    alteracoes = (pd.concat(alteracoes, ignore_index=True) if alteracoes
+                  else pd.DataFrame(columns=["PLACA", "COLUNA", "ANTES", "DEPOIS"]))
+    transicoes = (alteracoes[alteracoes["COLUNA"] == "STATUS"]
+                  .drop(columns="COLUNA")
+                  .rename(columns={"ANTES": "STATUS_ANTES", "DEPOIS": "STATUS_DEPOIS"})
+                  .reset_index(drop=True))
+    return DiferencaFrota(entradas, saidas, transicoes, alteracoes)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def obter_diferenca(chave_anterior, chave_atual, _df_anterior, _df_atual):
+    return comparar_snapshots(
+        _df_anterior, _df_atual,
+        placas_anterior=obter_indice_placas(chave_anterior, _df_anterior).por_linha,
+        placas_atual=obter_indice_placas(chave_atual, _df_atual).por_linha,
+    )
+
+def registrar_snapshot(chave, df_base):
+    """
+    Guarda na sessão a planilha anterior e a atual (referências aos
+    DataFrames compartilhados, sem cópia) e devolve a DiferencaFrota entre
+    elas, ou None enquanto só houve uma versão.
+    """
+    atual = st.session_state.get("_snapshot_atual")
+    if atual is None or atual[0] != chave:
+        st.session_state["_snapshot_anterior"] = atual
+        st.session_state["_snapshot_atual"] = (chave, df_base)
+    anterior = st.session_state.get("_snapshot_anterior")
+    if anterior is None:
+        return None
+    return obter_diferenca(anterior[0], chave, anterior[1], df_base)
+
+# =====================================================
+# AGREGAÇÃO (KPIs + GRÁFICOS NUMA PASSADA)
+# =====================================================
+@dataclass(frozen=True)
+class ResumoFrota:
+    """Contagens da frota filtrada lidas pelo header, pelos KPIs e pelos painéis."""
+    total: int
+    em_operacao: int
+    disponiveis: int
+    manutencao: int
+    status_df: pd.DataFrame
+    tipo_df: pd.DataFrame
+    posicao_df: pd.DataFrame
+    uf_origem_df: pd.DataFrame
+
+    @property
+    def taxa_disponibilidade(self):
+        return ((self.total - self.manutencao) / self.total * 100) if self.total > 0 else 0.0
+
+def _contar_codigos(coluna, mascara):
+    """(categorias, contagens) de uma coluna categórica, só nas linhas da máscara."""
+    if not isinstance(coluna.dtype, pd.CategoricalDtype):
+        coluna = coluna.astype("category")
+    categorias = coluna.cat.categories
+    codigos = coluna.cat.codes.to_numpy()[mascara]
+    return categorias, np.bincount(codigos[codigos >= 0], minlength=len(categorias))
+
+def _tabela_contagem(nome, categorias, contagens):
+    """DataFrame nome/QUANTIDADE sem zeros, do maior para o menor."""
+    tabela = pd.DataFrame({nome: np.asarray(categorias, dtype=object), "QUANTIDADE": contagens})
+    tabela = tabela[tabela["QUANTIDADE"] > 0]
+    return tabela.sort_values("QUANTIDADE", ascending=False, kind="stable").reset_index(drop=True)
+
+def agregar_frota(df, mascara):
+    """
+    Calcula todos os KPIs e as quatro tabelas dos gráficos com um
+    np.bincount por dimensão sobre os códigos categóricos das linhas da
+    máscara — sem copiar nem reagrupar o DataFrame.
+    """
+    contagens = {
+        coluna: _contar_codigos(df[coluna], mascara)
+        for coluna in DIMENSOES_FILTRO if coluna in df.columns
     }
-    bg, fg = estilos.get(status, ("#252525", "#ffffff"))
-    return [f'background-color: {bg}; color: {fg}'] * len(row)
+    return _montar_resumo(int(np.count_nonzero(mascara)), contagens)
+
+def _montar_resumo(total, contagens):
+    """ResumoFrota a partir de {dimensão: (categorias, contagens)} — vindas das linhas ou do cubo."""
+    categorias, por_codigo = contagens["STATUS"]
+    por_status = dict(zip(categorias, por_codigo.tolist()))
+
+    status_presentes = [s for s in ORDEM_STATUS if por_status.get(s, 0) > 0]
+    status_df = pd.DataFrame({
+        "STATUS": status_presentes,
+        "QUANTIDADE": [por_status[s] for s in status_presentes],
+    })
+
+    tabelas = {}
+    for coluna in ["TIPO", "POSIÇÃO ATUAL", "UF_ORIGEM"]:
+        if coluna in contagens:
+            tabelas[coluna] = _tabela_contagem(coluna, *contagens[coluna])
+        else:
+            tabelas[coluna] = pd.DataFrame()
+
+    return ResumoFrota(
+        total=total,
+        em_operacao=sum(por_status.get(s, 0) for s in STATUS_EM_OPERACAO),
+        disponiveis=sum(por_status.get(s, 0) for s in STATUS_DISPONIVEIS),
+        manutencao=sum(por_status.get(s, 0) for s in STATUS_MANUTENCAO),
+        status_df=status_df,
+        tipo_df=tabelas["TIPO"],
+        posicao_df=tabelas["POSIÇÃO ATUAL"],
+        uf_origem_df=tabelas["UF_ORIGEM"],
+    )
+
+# =====================================================
+# CUBO DE CONTAGENS (STATUS × TIPO × POSIÇÃO × UF)
+# =====================================================
+# Acima disso o cubo denso não compensa e a agregação volta a ser por linhas
+LIMITE_CELULAS_CUBO = 5_000_000
+
+class CuboFrota:
+    """
+    Contagem de veículos em cada combinação de códigos das dimensões do
+    sidebar, num ndarray denso montado uma vez por planilha. Cada eixo tem
+    uma posição extra no fim para as linhas sem valor naquela dimensão —
+    elas só saem da conta quando a dimensão é filtrada, como no
+    IndiceFiltros. Qualquer seleção vira um recorte do cubo e as tabelas
+    dos gráficos são somas sobre os outros eixos: o custo depende do
+    número de categorias, não do de linhas.
+    """
+
+    def __init__(self, df, dimensoes=DIMENSOES_FILTRO):
+        self.dimensoes = [d for d in dimensoes if d in df.columns]
+        self.categorias = {}   # dimensão → categorias (na ordem dos códigos)
+        self.codigo = {}       # dimensão → {valor: código}
+        codigos = []
+        for dim in self.dimensoes:
+            coluna = df[dim]
+            if not isinstance(coluna.dtype, pd.CategoricalDtype):
+                coluna = coluna.astype("category")
+            categorias = coluna.cat.categories
+            cod = coluna.cat.codes.to_numpy().astype(np.int64)
+            cod[cod < 0] = len(categorias)
+            self.categorias[dim] = categorias
+            self.codigo[dim] = {valor: k for k, valor in enumerate(categorias)}
+            codigos.append(cod)
+        forma = tuple(len(self.categorias[d]) + 1 for d in self.dimensoes)
+        plano = np.ravel_multi_index(codigos, forma) if codigos else np.zeros(len(df), dtype=np.int64)
+        self.contagens = np.bincount(plano, minlength=int(np.prod(forma))).reshape(forma)
+
+    @staticmethod
+    def cabe(df, dimensoes=DIMENSOES_FILTRO, limite=LIMITE_CELULAS_CUBO):
+        """True se o cubo da planilha fica dentro do limite de células."""
+        celulas = 1
+        for dim in dimensoes:
+            if dim in df.columns:
+                coluna = df[dim]
+                n = len(coluna.cat.categories) if isinstance(coluna.dtype, pd.CategoricalDtype) else coluna.nunique()
+                celulas *= n + 1
+        return celulas <= limite
+
+    def _recorte(self, selecao):
+        """(sub-cubo, códigos mantidos em cada eixo) para a seleção {dimensão: valores}."""
+        sub, mantidos = self.contagens, []
+        for eixo, dim in enumerate(self.dimensoes):
+            if dim in selecao:
+                codigo = self.codigo[dim]
+                idx = np.array(sorted({codigo[v] for v in selecao[dim] if v in codigo}), dtype=np.intp)
+                sub = np.take(sub, idx, axis=eixo)
+            else:
+                idx = np.arange(sub.shape[eixo])
+            mantidos.append(idx)
+        return sub, mantidos
+
+    def _marginal(self, sub, mantidos, dim):
+        """Contagem por categoria de `dim` no sub-cubo (sem a posição dos vazios)."""
+        eixo = self.dimensoes.index(dim)
+        somas = sub.sum(axis=tuple(i for i in range(sub.ndim) if i != eixo))
+        por_codigo = np.zeros(len(self.categorias[dim]) + 1, dtype=np.int64)
+        por_codigo[mantidos[eixo]] = somas
+        return por_codigo[:-1]
+
+    def valores(self, dim, selecao):
+        """Valores de `dim` com ao menos um veículo dentro da seleção."""
+        sub, mantidos = self._recorte(selecao)
+        por_codigo = self._marginal(sub, mantidos, dim)
+        return [valor for valor, n in zip(self.categorias[dim], por_codigo) if n]
+
+    def agregar(self, selecao):
+        """Mesmo ResumoFrota que agregar_frota(df, indice.filtrar(selecao)), lido do cubo."""
+        sub, mantidos = self._recorte(selecao)
+        contagens = {
+            dim: (self.categorias[dim], self._marginal(sub, mantidos, dim))
+            for dim in self.dimensoes
+        }
+        return _montar_resumo(int(sub.sum()), contagens)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def obter_cubo_frota(chave, _df):
+    """Cubo da planilha `chave`, ou None se ele passaria de LIMITE_CELULAS_CUBO."""
+    return CuboFrota(_df) if CuboFrota.cabe(_df) else None
+
+# =====================================================
+# SUBCONJUNTOS DOS KPIs (POSIÇÕES DE LINHA NA BASE)
+# =====================================================
+# KPI → STATUS que entram no detalhamento (None = todos os filtrados)
+KPIS_STATUS = {
+    "TOTAL DE VEÍCULOS": None,
+    "EM OPERAÇÃO":       STATUS_EM_OPERACAO,
+    "DISPONÍVEIS":       STATUS_DISPONIVEIS,
+    "MANUTENÇÃO":        STATUS_MANUTENCAO,
+}
+
+def registrar_subconjuntos_kpi(chave, indice, filtro):
+    """
+    Guarda no session_state só as posições (int32) das linhas de cada KPI
+    sobre a base compartilhada da planilha `chave` — nada de cópias do
+    DataFrame por sessão. Permite reabrir o detalhamento após um rerun.
+    """
+    for titulo, status in KPIS_STATUS.items():
+        mascara = filtro if status is None else filtro & indice.mascara("STATUS", status)
+        st.session_state[f"_kpi_idx_{titulo}"] = np.flatnonzero(mascara).astype(np.int32)
+    st.session_state["_kpi_chave"] = chave
+
+def obter_subconjunto_kpi(titulo, chave, df_base):
+    """
+    (posições, DataFrame) do KPI — o DataFrame reconstruído com take nas
+    posições — ou (None, None) se não houver registro para esta planilha.
+    """
+    posicoes = st.session_state.get(f"_kpi_idx_{titulo}")
+    if posicoes is None or st.session_state.get("_kpi_chave") != chave:
+        return None, None
+    return posicoes, df_base.take(posicoes)
+
+# Status → (cor de fundo, cor do texto) das linhas da tabela detalhada
+ESTILOS_STATUS_TABELA = {
+    "MANUTENÇÃO":                  ("#3d1f1f", "#ff3c00"),
+    "DISPONÍVEIS NÃO TRIPULADO":   ("#1a2e1a", "#4caf50"),
+    "DISPONÍVEIS TRIPULADO":       ("#1a2e1a", "#0aec0a"),
+    "CARREGADO":                   ("#2e2010", "#ff9800"),
+    "RETORNANDO DISPONÍVEIS":      ("#101a2e", "#2196f3"),
+    "APOIO FILIAL":                ("#2e2e2e", "#ffffff"),
+    "INDISPONÍVEIS":               ("#1e2025", "#94a3b8"),
+    "FORA DE OPERAÇÃO":            ("#1a1c1f", "#64748b"),
+    "RETORNANDO INDISPONÍVEIS":    ("#1e2025", "#cbd5e1"),
+}
+# CSS de cada status montado uma vez, não a cada linha
+CSS_STATUS_TABELA = {status: f'background-color: {bg}; color: {fg}'
+                     for status, (bg, fg) in ESTILOS_STATUS_TABELA.items()}
+CSS_STATUS_PADRAO = 'background-color: #252525; color: #ffffff'
+
+# Tabelas maiores que isso não passam pelo Styler (que gera CSS célula a
+# célula): o status ganha um marcador colorido via column_config
+LIMITE_LINHAS_ESTILO = 1000
+MARCADORES_STATUS = {
+    "MANUTENÇÃO":                "🔴",
+    "DISPONÍVEIS NÃO TRIPULADO": "🟢",
+    "DISPONÍVEIS TRIPULADO":     "✅",
+    "CARREGADO":                 "🟠",
+    "RETORNANDO DISPONÍVEIS":    "🔵",
+    "APOIO FILIAL":              "⚪",
+    "INDISPONÍVEIS":             "⚫",
+    "FORA DE OPERAÇÃO":          "⬛",
+    "RETORNANDO INDISPONÍVEIS":  "🔘",
+}
+
+def estilos_tabela_status(df):
+    """
+    CSS de todas as células de uma vez (Styler.apply com axis=None): o STATUS
+    é mapeado por categoria e o resultado replicado para as colunas.
+    """
+    css = df["STATUS"].map(CSS_STATUS_TABELA).astype(object).fillna(CSS_STATUS_PADRAO).to_numpy()
+    return pd.DataFrame(np.repeat(css[:, None], df.shape[1], axis=1), index=df.index, columns=df.columns)
 
 # =====================================================
 # GRÁFICOS
 # =====================================================
+# ── Barras: um único trace por gráfico, com a cor de cada barra num array ──
+def cores_da_paleta(paleta, n):
+    """Cor de cada uma das n barras/fatias, ciclando a paleta."""
+    return [paleta[i % len(paleta)] for i in range(n)]
+
+def trace_barras(categorias, valores, cores, horizontal=False, rotulo="Quantidade"):
+    eixo_cat, eixo_val = ("y", "x") if horizontal else ("x", "y")
+    valores = list(valores)
+    return go.Bar(
+        **{eixo_cat: list(categorias), eixo_val: valores},
+        orientation='h' if horizontal else 'v',
+        marker=dict(color=cores, line=dict(color='rgba(255,255,255,0.2)', width=1)),
+        text=valores, textposition='outside',
+        textfont=dict(color='#ffffff', size=20, family='Arial Black'),
+        hovertemplate=f'<b>%{{{eixo_cat}}}</b><br>{rotulo}: %{{{eixo_val}}}<extra></extra>', showlegend=False
+    )
+
 def criar_grafico_status(status_df):
-    fig = go.Figure()
-    for idx, row in status_df.iterrows():
-        cor = CORES_STATUS.get(row["STATUS"], "#888888")
-        fig.add_trace(go.Bar(
-            y=[row["STATUS"]], x=[row["QUANTIDADE"]], orientation='h',
-            marker=dict(color=cor, line=dict(color='rgba(255,255,255,0.2)', width=1)),
-            text=row["QUANTIDADE"], textposition='outside',
-            textfont=dict(color='#ffffff', size=20, family='Arial Black'),
-            hovertemplate='<b>%{y}</b><br>Quantidade: %{x}<extra></extra>', showlegend=False
-        ))
+    cores = [CORES_STATUS.get(status, "#888888") for status in status_df["STATUS"]]
+    fig = go.Figure(trace_barras(status_df["STATUS"], status_df["QUANTIDADE"], cores, horizontal=True))
     fig.update_layout(
         hoverlabel=dict(bgcolor='#1e1e1e', bordercolor='#555', font=dict(size=18, color='#ffffff', family='Arial Black'), namelength=-1),
         height=320, showlegend=False, margin=dict(l=0, r=50, t=10, b=0),
@@ -646,16 +2684,8 @@ def criar_grafico_status(status_df):
     return fig
 
 def criar_grafico_tipo(tipo_df):
-    fig = go.Figure()
-    for idx, row in tipo_df.iterrows():
-        cor = CORES_TIPO_VEICULO[idx % len(CORES_TIPO_VEICULO)]
-        fig.add_trace(go.Bar(
-            x=[row["TIPO"]], y=[row["QUANTIDADE"]],
-            marker=dict(color=cor, line=dict(color='rgba(255,255,255,0.2)', width=1)),
-            text=row["QUANTIDADE"], textposition='outside',
-            textfont=dict(color='#ffffff', size=20, family='Arial Black'),
-            hovertemplate='<b>%{x}</b><br>Quantidade: %{y}<extra></extra>', showlegend=False
-        ))
+    cores = cores_da_paleta(CORES_TIPO_VEICULO, len(tipo_df))
+    fig = go.Figure(trace_barras(tipo_df["TIPO"], tipo_df["QUANTIDADE"], cores))
     valor_max = tipo_df["QUANTIDADE"].max() if not tipo_df.empty else 10
     altura_minima = max(320, valor_max * 4 + 80)
     fig.update_layout(
@@ -674,7 +2704,7 @@ def criar_grafico_tipo(tipo_df):
 def criar_grafico_posicao(posicao_df, fullscreen=False):
     df_plot = posicao_df if fullscreen else posicao_df.head(10)
     n = len(df_plot)
-    cores = [CORES_POSICAO[i % len(CORES_POSICAO)] for i in range(n)]
+    cores = cores_da_paleta(CORES_POSICAO, n)
     fig = go.Figure(data=[go.Pie(
         labels=df_plot["POSIÇÃO ATUAL"], values=df_plot["QUANTIDADE"],
         hole=0.62,
@@ -706,16 +2736,8 @@ def criar_grafico_posicao(posicao_df, fullscreen=False):
     return fig
 
 def criar_grafico_uf_origem(uf_df):
-    fig = go.Figure()
-    for idx, row in uf_df.iterrows():
-        cor = CORES_UF[idx % len(CORES_UF)]
-        fig.add_trace(go.Bar(
-            x=[row["UF_ORIGEM"]], y=[row["QUANTIDADE"]],
-            marker=dict(color=cor, line=dict(color='rgba(255,255,255,0.2)', width=1)),
-            text=row["QUANTIDADE"], textposition='outside',
-            textfont=dict(color='#ffffff', size=20, family='Arial Black'),
-            hovertemplate='<b>%{x}</b><br>Veículos: %{y}<extra></extra>', showlegend=False
-        ))
+    cores = cores_da_paleta(CORES_UF, len(uf_df))
+    fig = go.Figure(trace_barras(uf_df["UF_ORIGEM"], uf_df["QUANTIDADE"], cores, rotulo="Veículos"))
     valor_max = uf_df["QUANTIDADE"].max() if not uf_df.empty else 10
     altura_minima = max(320, valor_max * 4 + 80)
     fig.update_layout(
@@ -731,6 +2753,72 @@ def criar_grafico_uf_origem(uf_df):
     )
     return fig
 
+# =====================================================
+# CACHE DE FIGURAS (LRU POR CONTEÚDO DO AGREGADO + MODO)
+# =====================================================
+LIMITE_FIGURAS = 64
+MODO_NORMAL, MODO_TELA_CHEIA = "normal", "tela_cheia"
+
+# gráfico → (função que monta, campo do ResumoFrota com o agregado)
+GRAFICOS = {
+    "status":  (criar_grafico_status,    "status_df"),
+    "posicao": (criar_grafico_posicao,   "posicao_df"),
+    "tipo":    (criar_grafico_tipo,      "tipo_df"),
+    "uf":      (criar_grafico_uf_origem, "uf_origem_df"),
+}
+
+def hash_agregado(df):
+    """Hash do conteúdo de uma tabela de contagem (colunas + valores)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update("\x1f".join(map(str, df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+class CacheFiguras:
+    """
+    Figuras Plotly prontas, compartilhadas entre as sessões e descartadas
+    pela menos usada. Um rerun que não muda o agregado (abrir KPI, tela
+    cheia, paginação…) reaproveita a figura em vez de remontá-la. As figuras
+    guardadas não devem ser alteradas por quem as recebe.
+    """
+
+    def __init__(self, limite=LIMITE_FIGURAS):
+        self.limite = limite
+        self._figuras = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, construir):
+        with self._trava:
+            fig = self._figuras.get(chave)
+            if fig is not None:
+                self._figuras.move_to_end(chave)
+                return fig
+        fig = construir()
+        with self._trava:
+            self._figuras[chave] = fig
+            while len(self._figuras) > self.limite:
+                self._figuras.popitem(last=False)
+        return fig
+
+@st.cache_resource(show_spinner=False)
+def obter_cache_figuras():
+    return CacheFiguras()
+
+def _montar_figura(grafico_id, dados, modo):
+    construir, _ = GRAFICOS[grafico_id]
+    if grafico_id == "posicao":
+        return construir(dados, fullscreen=modo == MODO_TELA_CHEIA)
+    fig = construir(dados)
+    if modo == MODO_TELA_CHEIA:
+        fig.update_layout(height=680, margin=dict(l=10, r=10, t=20, b=10), paper_bgcolor='#141414', plot_bgcolor='#141414')
+    return fig
+
+def figura_grafico(grafico_id, resumo, modo=MODO_NORMAL):
+    """Figura do gráfico `grafico_id` para o `resumo`, vinda do cache quando o agregado não mudou."""
+    dados = getattr(resumo, GRAFICOS[grafico_id][1])
+    chave = (grafico_id, modo, hash_agregado(dados))
+    return obter_cache_figuras().obter(chave, lambda: _montar_figura(grafico_id, dados, modo))
+
 # =====================================================
 # HELPERS DO DIALOG
 # =====================================================
@@ -739,127 +2827,238 @@ def _hex_to_rgba(hex_color, alpha=0.12):
     r, g, b = tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
     return f"rgba({r},{g},{b},{alpha})"
 
-def _html_mini_card(veiculo):
-    status    = str(veiculo.get("STATUS", "")).strip()
-    placa     = str(veiculo.get("PLACA", "—")).strip()
-    motorista = str(veiculo.get("MOTORISTA", "")).strip()
-    if motorista.upper() in ("", "NAN", "NONE"):
-        motorista = "—"
-    cor_status = CORES_STATUS.get(status, "#888888")
-    cor_fundo  = _hex_to_rgba(cor_status, 0.22)
-    cor_borda  = _hex_to_rgba(cor_status, 0.70)
-    return f"""
-    <div class="mini-card-veiculo" style="background:{cor_fundo};border:2px solid {cor_borda};border-left:5px solid {cor_status};box-shadow: 0 0 10px {_hex_to_rgba(cor_status, 0.18)};">
-        <span class="mini-card-placa" style="color:{cor_status};text-shadow:0 0 10px {_hex_to_rgba(cor_status, 0.5)};">🚛 {placa}</span>
-        <span class="mini-card-status-badge" style="background:{_hex_to_rgba(cor_status, 0.30)};border:1px solid {cor_status};color:{cor_status};">{status}</span>
-        <span class="mini-card-motorista">👤 {motorista}</span>
+# ── Cards em lote ──
+# Os cards de um DataFrame saem numa única passada: as variações de cor de cada
+# status são resolvidas uma vez na importação (moldes por cor) e os valores são
+# formatados coluna a coluna, em vez de célula a célula por linha.
+COR_STATUS_PADRAO = "#888888"
+# Campos prioritários — aparecem primeiro no card
+CAMPOS_PRIORIDADE_CARD = ["POSIÇÃO ATUAL", "UF_ORIGEM", "UF_DESTINO",
+                          "DESTINO FINAL", "MOTORISTA", "OPERAÇÃO"]
+# Campos que já ficam no cabeçalho — não repetir no corpo
+CAMPOS_CABECALHO_CARD = {"PLACA", "STATUS", "TIPO"}
+VALORES_VAZIOS_CARD = ["", "NAN", "NONE", "NAT", "UNNAMED"]
+_CAMPO_MOLDE = re.compile(r"\{\w+\}")
+
+def _compactar_html(html):
+    """Junta as linhas sem indentação: linha em branco no meio do HTML encerraria o bloco no markdown."""
+    return "".join(linha.strip() for linha in html.splitlines())
+
+def _partes_molde(html):
+    """Trechos fixos de um molde compactado, separados nos campos `{nome}`."""
+    return tuple(_CAMPO_MOLDE.split(_compactar_html(html)))
+
+def _moldes_cor(cor):
+    """
+    Moldes HTML de uma cor de status, com todas as transparências já calculadas.
+    Cada molde é a tupla dos trechos fixos entre os campos: o card sai por
+    concatenação, sem str.format sobre centenas de caracteres a cada campo.
+    """
+    mini = f"""
+    <div class="mini-card-veiculo" style="background:{_hex_to_rgba(cor, 0.22)};border:2px solid {_hex_to_rgba(cor, 0.70)};border-left:5px solid {cor};box-shadow: 0 0 10px {_hex_to_rgba(cor, 0.18)};">
+        <span class="mini-card-placa" style="color:{cor};text-shadow:0 0 10px {_hex_to_rgba(cor, 0.5)};">🚛 {{placa}}</span>
+        <span class="mini-card-status-badge" style="background:{_hex_to_rgba(cor, 0.30)};border:1px solid {cor};color:{cor};">{{status}}</span>
+        <span class="mini-card-motorista">👤 {{motorista}}</span>
     </div>
     """
-
-def _html_card_completo(veiculo):
-    # Campos prioritários — aparecem primeiro no card
-    campos_prioridade = ["POSIÇÃO ATUAL", "UF_ORIGEM", "UF_DESTINO",
-                         "DESTINO FINAL", "MOTORISTA", "OPERAÇÃO"]
-    # Campos que já ficam no cabeçalho — não repetir no corpo
-    campos_cabecalho  = {"PLACA", "STATUS", "TIPO"}
-
-    status     = str(veiculo.get("STATUS", "")).strip()
-    placa      = str(veiculo.get("PLACA",  "—")).strip()
-    tipo       = str(veiculo.get("TIPO",   "—")).strip()
-    cor_status = CORES_STATUS.get(status, "#888888")
-    cor_fundo  = _hex_to_rgba(cor_status, 0.28)
-    cor_borda  = _hex_to_rgba(cor_status, 0.80)
-    cor_ib     = _hex_to_rgba(cor_status, 0.12)
-    cor_ib2    = _hex_to_rgba(cor_status, 0.35)
-
-    # Monta ordem: prioritários primeiro, depois todos os demais
-    todos_campos = list(veiculo.index)
-    campos_extras = [c for c in todos_campos
-                     if c not in campos_cabecalho and c not in campos_prioridade]
-    ordem_final = campos_prioridade + campos_extras
-
-    def _valor_valido(val):
-        """Retorna True se o valor tem conteúdo útil para exibir"""
-        if val is None:
-            return False
-        try:
-            if pd.isna(val):
-                return False
-        except (TypeError, ValueError):
-            pass
-        s = str(val).strip().upper()
-        return s not in ("", "NAN", "NONE", "NAT", "NaT".upper(), "UNNAMED")
-
-    info_items = ""
-    for campo in ordem_final:
-        val = veiculo.get(campo)
-        if not _valor_valido(val):
-            continue
-        # Formata valor: datas, números inteiros, floats
-        val_str = str(val).strip()
-        # Remove ".0" de floats que são inteiros (ex: "123.0" → "123")
-        try:
-            f = float(val_str)
-            if f == int(f):
-                val_str = str(int(f))
-        except (ValueError, TypeError):
-            pass
-
-        label = str(campo).replace("_", " ").title()
-        info_items += f"""
+    item = f"""
         <div style="display:flex; flex-direction:column; gap:6px; padding:16px 18px;
-                    border-radius:10px; background:{cor_ib}; border:1px solid {cor_ib2};
+                    border-radius:10px; background:{_hex_to_rgba(cor, 0.12)}; border:1px solid {_hex_to_rgba(cor, 0.35)};
                     min-width:0; word-break:break-word;">
             <span style="font-size:0.72rem; text-transform:uppercase; letter-spacing:1.1px;
-                         font-weight:700; color:{cor_status}; opacity:0.9;">{label}</span>
-            <span style="color:#ffffff; font-size:1.15rem; font-weight:600; line-height:1.3;">{val_str}</span>
+                         font-weight:700; color:{cor}; opacity:0.9;">{{rotulo}}</span>
+            <span style="color:#ffffff; font-size:1.15rem; font-weight:600; line-height:1.3;">{{valor}}</span>
         </div>"""
-
-    divider  = f'<hr style="border:none; border-top:1px solid {cor_status}; margin:16px 0 14px 0; opacity:0.4;">' if info_items else ""
-    info_blk = f'<div style="display:grid; grid-template-columns:repeat(auto-fill, minmax(clamp(140px, 18vw, 220px), 1fr)); gap:clamp(8px, 1.2vw, 14px);">{info_items}</div>' if info_items else ""
-
-    return f"""
+    corpo = (f'<hr style="border:none; border-top:1px solid {cor}; margin:16px 0 14px 0; opacity:0.4;">'
+             '<div style="display:grid; grid-template-columns:repeat(auto-fill, minmax(clamp(140px, 18vw, 220px), 1fr)); gap:clamp(8px, 1.2vw, 14px);">{itens}</div>')
+    completo = f"""
     <div style="border-radius:14px; padding:30px 28px; margin-bottom:14px; box-sizing:border-box; width:100%;
-        background:{cor_fundo}; border:2px solid {cor_borda}; border-left:8px solid {cor_status};
-        box-shadow:0 0 24px {_hex_to_rgba(cor_status, 0.30)}, 0 4px 20px rgba(0,0,0,0.5);">
+        background:{_hex_to_rgba(cor, 0.28)}; border:2px solid {_hex_to_rgba(cor, 0.80)}; border-left:8px solid {cor};
+        box-shadow:0 0 24px {_hex_to_rgba(cor, 0.30)}, 0 4px 20px rgba(0,0,0,0.5);">
         <div style="display:flex; flex-wrap:wrap; align-items:center; justify-content:space-between; gap:14px;">
             <div style="display:flex; flex-wrap:wrap; align-items:center; gap:14px; min-width:0;">
                 <span style="font-size:clamp(1.6rem, 4vw, 2.2rem); font-weight:900; letter-spacing:4px;
-                             font-family:monospace; white-space:nowrap; color:{cor_status};
-                             text-shadow:0 0 20px {_hex_to_rgba(cor_status, 0.7)};">🚛 {placa}</span>
+                             font-family:monospace; white-space:nowrap; color:{cor};
+                             text-shadow:0 0 20px {_hex_to_rgba(cor, 0.7)};">🚛 {{placa}}</span>
                 <span style="font-size:1rem; font-weight:700; padding:6px 16px; border-radius:20px;
                              white-space:nowrap; color:#fff;
-                             background:{_hex_to_rgba(cor_status, 0.25)};
-                             border:1px solid {_hex_to_rgba(cor_status, 0.5)};">{tipo}</span>
+                             background:{_hex_to_rgba(cor, 0.25)};
+                             border:1px solid {_hex_to_rgba(cor, 0.5)};">{{tipo}}</span>
             </div>
             <span style="font-size:0.85rem; font-weight:800; text-transform:uppercase; letter-spacing:1.4px;
                          padding:9px 20px; border-radius:20px; white-space:nowrap; flex-shrink:0;
-                         background:{_hex_to_rgba(cor_status, 0.35)}; border:2px solid {cor_status};
-                         color:{cor_status}; box-shadow:0 0 12px {_hex_to_rgba(cor_status, 0.5)};">{status}</span>
+                         background:{_hex_to_rgba(cor, 0.35)}; border:2px solid {cor};
+                         color:{cor}; box-shadow:0 0 12px {_hex_to_rgba(cor, 0.5)};">{{status}}</span>
         </div>
-        {divider}
-        {info_blk}
+        {{corpo}}
     </div>"""
+    return {"mini": _partes_molde(mini), "item": _partes_molde(item),
+            "corpo": _partes_molde(corpo), "completo": _partes_molde(completo)}
+
+MOLDES_CARD = {cor: _moldes_cor(cor) for cor in {*CORES_STATUS.values(), COR_STATUS_PADRAO}}
+
+def _textos_coluna(df, coluna, padrao):
+    if coluna not in df.columns:
+        return [padrao] * len(df)
+    return [str(v).strip() for v in df[coluna].tolist()]
+
+def _formatar_coluna(serie):
+    """
+    Texto de cada célula para o corpo do card, ou None onde o campo deve ser omitido
+    (nulos e marcadores como "nan"/"None"). Números inteiros gravados como float
+    ("123.0", 1.5e3) saem sem a parte decimal. Colunas categóricas são formatadas
+    uma vez por categoria.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = _formatar_coluna(pd.Series(serie.cat.categories, dtype=object))
+        return np.append(categorias, None)[serie.cat.codes.to_numpy()]   # código -1 (nulo) → None
+    textos = pd.Series([str(v).strip() for v in serie.tolist()], dtype=object)
+    vazio = serie.isna().to_numpy() | textos.str.upper().isin(VALORES_VAZIOS_CARD).to_numpy()
+    numeros = pd.to_numeric(textos.where(~vazio), errors="coerce").to_numpy(dtype=float)
+    with np.errstate(invalid="ignore"):
+        inteiro = np.isfinite(numeros) & (numeros == np.floor(numeros))
+    # inteiros já escritos só com dígitos ficam como estão (sem arredondar pelo float)
+    inteiro &= ~textos.str.isdigit().to_numpy(dtype=bool)
+    valores = textos.to_numpy()
+    valores[inteiro] = [str(int(f)) for f in numeros[inteiro]]
+    valores[vazio] = None
+    return valores
+
+def _cores_card(status):
+    return [CORES_STATUS.get(s, COR_STATUS_PADRAO) for s in status]
+
+def renderizar_mini_cards(df):
+    """HTML de um mini card por linha de `df`, na ordem das linhas."""
+    status = _textos_coluna(df, "STATUS", "")
+    placas = _textos_coluna(df, "PLACA", "—")
+    motoristas = [m if m.upper() not in ("", "NAN", "NONE") else "—"
+                  for m in _textos_coluna(df, "MOTORISTA", "")]
+    cards = []
+    for cor, placa, st_, motorista in zip(_cores_card(status), placas, status, motoristas):
+        a, b, c, d = MOLDES_CARD[cor]["mini"]
+        cards.append(a + placa + b + st_ + c + motorista + d)
+    return cards
+
+def renderizar_cards_completos(df):
+    """HTML do card expandido de cada linha de `df`: cabeçalho e todos os campos preenchidos."""
+    ordem = [c for c in CAMPOS_PRIORIDADE_CARD if c in df.columns]
+    ordem += [c for c in df.columns if c not in CAMPOS_CABECALHO_CARD and c not in CAMPOS_PRIORIDADE_CARD]
+    rotulos = [str(c).replace("_", " ").title() for c in ordem]
+    colunas = [_formatar_coluna(df.iloc[:, j]) for j in (df.columns.get_loc(c) for c in ordem)]
+    status = _textos_coluna(df, "STATUS", "")
+    placas = _textos_coluna(df, "PLACA", "—")
+    tipos = _textos_coluna(df, "TIPO", "—")
+    cores = _cores_card(status)
+    # abertura de cada campo (cor + rótulo) montada uma vez por cor presente
+    aberturas = {cor: [MOLDES_CARD[cor]["item"][0] + r + MOLDES_CARD[cor]["item"][1] for r in rotulos]
+                 for cor in set(cores)}
+    cards = []
+    for i, cor in enumerate(cores):
+        moldes = MOLDES_CARD[cor]
+        fecho = moldes["item"][2]
+        itens = "".join(abertura + valores[i] + fecho
+                        for abertura, valores in zip(aberturas[cor], colunas) if valores[i] is not None)
+        corpo = moldes["corpo"][0] + itens + moldes["corpo"][1] if itens else ""
+        a, b, c, d, e = moldes["completo"]
+        cards.append(a + placas[i] + b + tipos[i] + c + status[i] + d + corpo + e)
+    return cards
+
+# ── Paginação da grade de mini cards ──
+# Só os cards da página atual viram elementos/widgets; o custo por rerun
+# fica constante qualquer que seja o tamanho da frota.
+CARDS_POR_LINHA = 4
+OPCOES_CARDS_POR_PAGINA = [12, 24, 48, 96]
+CARDS_POR_PAGINA_PADRAO = 24
+
+# Modo de renderização da grade:
+#   "lote"   → a página inteira vira UM st.markdown + UM selectbox para abrir o veículo
+#   "botoes" → um st.markdown + um st.button "▶ ABRIR" por card (layout original)
+MODOS_GRADE = {"lote": "⚡ Grade única", "botoes": "▶ Botão por card"}
+MODO_GRADE_PADRAO = "lote"
+
+def _html_grade_cards(df_pagina):
+    """
+    Monta todos os mini cards da página num único bloco HTML (CSS grid).
+    """
+    cards = "".join(renderizar_mini_cards(df_pagina))
+    return ('<div style="display:grid; grid-template-columns:repeat(auto-fill, minmax(clamp(160px, 20vw, 260px), 1fr));'
+            f' gap:clamp(8px, 1vw, 12px); margin-bottom:14px;">{cards}</div>')
+
+def _selecionar_veiculo(key_sel, key_aberto, placa):
+    """Callback de ▶ ABRIR (placa) e ← VOLTAR (None); o fragment reexecuta sozinho."""
+    st.session_state[key_sel]    = placa
+    st.session_state[key_aberto] = True
+
+def _abrir_veiculo_da_grade(key_widget, key_sel, placas):
+    """Callback do selectbox da grade: posição escolhida → placa do nível 2."""
+    posicao = st.session_state.get(key_widget)
+    if posicao is not None:
+        st.session_state[key_sel] = placas[posicao]
+        st.session_state[key_widget] = None
+
+def _preferencia_grade(chave, opcoes, padrao):
+    """
+    Índice inicial de um seletor da grade. O Streamlit descarta o estado de
+    widgets que não são renderizados num rerun (ex.: enquanto o nível 2 está
+    aberto), então a última escolha fica guardada numa chave própria.
+    """
+    valor = st.session_state.get(f"{chave}_pref", padrao)
+    return opcoes.index(valor) if valor in opcoes else opcoes.index(padrao)
+
+def _pagina_atual(titulo, total, tamanho, assinatura):
+    """
+    Devolve (pagina, n_paginas) para a grade do KPI `titulo`.
+    A página fica no session_state e volta para a primeira quando a busca,
+    o filtro de status ou o tamanho da página mudam (`assinatura`).
+    """
+    key_pag = f"_kpi_pag_{titulo}"
+    key_ref = f"_kpi_pag_ref_{titulo}"
+    n_paginas = max(1, -(-total // tamanho))
+    if st.session_state.get(key_ref) != assinatura:
+        st.session_state[key_ref] = assinatura
+        st.session_state[key_pag] = 0
+    pagina = min(max(st.session_state.get(key_pag, 0), 0), n_paginas - 1)
+    st.session_state[key_pag] = pagina
+    return pagina, n_paginas
+
+def _mudar_pagina(titulo, delta, n_paginas):
+    key_pag = f"_kpi_pag_{titulo}"
+    st.session_state[key_pag] = min(max(st.session_state.get(key_pag, 0) + delta, 0), n_paginas - 1)
+
+def _navegacao_paginas(titulo, pagina, n_paginas, inicio, fim, total, posicao):
+    """Barra ◀ / página X de Y / ▶ — `posicao` distingue as barras de cima e de baixo."""
+    if n_paginas <= 1:
+        return
+    col_ant, col_info, col_prox = st.columns([1, 4, 1])
+    with col_ant:
+        st.button("◀ ANTERIOR", key=f"pag_ant_{posicao}_{titulo}", use_container_width=True,
+                  disabled=pagina == 0, on_click=_mudar_pagina, args=(titulo, -1, n_paginas))
+    with col_info:
+        st.markdown(f"""<div style="text-align:center; color:#aaaaaa; font-size:0.9rem; padding-top:8px;">
+        Página <b style="color:#fff;">{pagina + 1}</b> de <b style="color:#fff;">{n_paginas}</b>
+        · veículos {inicio + 1}–{fim} de {total}</div>""", unsafe_allow_html=True)
+    with col_prox:
+        st.button("PRÓXIMA ▶", key=f"pag_prox_{posicao}_{titulo}", use_container_width=True,
+                  disabled=pagina >= n_paginas - 1, on_click=_mudar_pagina, args=(titulo, 1, n_paginas))
 
 # =====================================================
 # DIALOG - DETALHAMENTO DO KPI (DOIS NÍVEIS)
 # BUG FIX: usa session_state para persistir qual dialog está aberto
 # e qual veículo foi selecionado, evitando o fechamento ao st.rerun()
 # =====================================================
-def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
+@st.fragment
+def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi, posicoes, indice_busca, indice_placas, chave):
     """
     Painel FULLSCREEN com DOIS NÍVEIS (renderizado na página, não como dialog).
+    `posicoes` são as linhas de `df_kpi` na base, usadas pelos índices de
+    busca e de placas. `chave` identifica a planilha para buscar as colunas
+    extras do card expandido.
+
+    É um fragment: busca, paginação, ABRIR e VOLTAR reexecutam só este painel.
+    INÍCIO e FECHAR voltam ao dashboard e por isso reexecutam o app inteiro.
     """
     # ── CSS fullscreen: esconde sidebar, expande o conteúdo ──
-    st.markdown("""
-    <style>
-    section[data-testid="stSidebar"] { display: none !important; }
-    .main .block-container {
-        padding: 1rem 1.5rem !important;
-        max-width: 100% !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.html(CSS_TELA_CHEIA)
 
     key_sel    = f"_kpi_sel_{titulo}"
     key_busca  = f"_kpi_busca_{titulo}"
@@ -877,8 +3076,13 @@ def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
     # ============================================================
     if st.session_state[key_sel] is not None:
         placa_sel = st.session_state[key_sel]
-        mask = df_kpi["PLACA"].astype(str).str.strip().str.upper() == placa_sel.upper()
-        resultado = df_kpi[mask]
+        locais = indice_placas.localizar(placa_sel, posicoes)
+        resultado = df_kpi.iloc[locais]
+        # Card completo: o núcleo já está na base; as demais colunas vêm sob demanda
+        extras = obter_colunas_extras(chave) if len(locais) else None
+        if extras is not None and len(extras.columns):
+            # alinhadas pela chave de linha (o índice), não pela posição
+            resultado = pd.concat([resultado, extras.reindex(resultado.index)], axis=1)
 
         cor_v = CORES_STATUS.get(
             str(resultado.iloc[0].get("STATUS", "")) if not resultado.empty else "",
@@ -886,27 +3090,7 @@ def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
         )
 
         # Botão VOLTAR no canto superior direito — laranja vivo
-        st.markdown("""
-        <style>
-        div[role="dialog"] button[kind="secondary"] {
-            background: #e65100 !important;
-            color: #ffffff !important;
-            border: 2px solid #ff6d00 !important;
-            border-radius: 8px !important;
-            font-size: 1rem !important;
-            font-weight: 900 !important;
-            padding: 8px 24px !important;
-            letter-spacing: 1.2px !important;
-            box-shadow: 0 0 18px rgba(230,81,0,0.75), 0 2px 8px rgba(0,0,0,0.5) !important;
-            min-width: 130px !important;
-        }
-        div[role="dialog"] button[kind="secondary"]:hover {
-            background: #bf360c !important;
-            box-shadow: 0 0 28px rgba(230,81,0,1) !important;
-            transform: scale(1.04) !important;
-        }
-        </style>
-        """, unsafe_allow_html=True)
+        st.html(CSS_BOTAO_VOLTAR)
 
         col_inicio_v, col_info_only, col_btn_v = st.columns([1, 4, 1])
         with col_inicio_v:
@@ -917,10 +3101,8 @@ def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
                     del st.session_state["_grafico_fs"]
                 st.rerun()
         with col_btn_v:
-            if st.button("← VOLTAR", key=f"btn_voltar_{titulo}", use_container_width=True, type="secondary"):
-                st.session_state[key_sel]    = None
-                st.session_state[key_aberto] = True
-                st.rerun()
+            st.button("← VOLTAR", key=f"btn_voltar_{titulo}", use_container_width=True, type="secondary",
+                      on_click=_selecionar_veiculo, args=(key_sel, key_aberto, None))
         with col_info_only:
             st.markdown(f"""
             <div style="border-left:4px solid {cor_v}; padding:8px 16px;
@@ -934,7 +3116,12 @@ def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
         if resultado.empty:
             st.warning("Veículo não encontrado.")
         else:
-            st.markdown(_html_card_completo(resultado.iloc[0]), unsafe_allow_html=True)
+            if indice_placas.eh_duplicada(placa_sel):
+                n_planilha = len(indice_placas.localizar(placa_sel))
+                st.warning(f"⚠️ Placa duplicada: {placa_sel} aparece em {n_planilha} linhas da planilha "
+                           f"({len(resultado)} nesta categoria).")
+            for card in renderizar_cards_completos(resultado):
+                st.markdown(card, unsafe_allow_html=True)
 
         return  # Encerra no nível 2
 
@@ -943,32 +3130,7 @@ def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
     # ============================================================
 
     # ── Barra de topo com botão FECHAR no canto direito ──
-    st.markdown(f"""
-    <style>
-    /* Botão FECHAR — vermelho vivo, canto superior direito do dialog */
-    div[role="dialog"] [data-testid="stButton"]:has(button[kind="secondary"]) {{
-        display: flex;
-        justify-content: flex-end;
-    }}
-    div[role="dialog"] button[kind="secondary"] {{
-        background: #c62828 !important;
-        color: #ffffff !important;
-        border: 2px solid #ef5350 !important;
-        border-radius: 8px !important;
-        font-size: 1rem !important;
-        font-weight: 900 !important;
-        padding: 8px 24px !important;
-        letter-spacing: 1.2px !important;
-        box-shadow: 0 0 18px rgba(198,40,40,0.75), 0 2px 8px rgba(0,0,0,0.5) !important;
-        min-width: 130px !important;
-    }}
-    div[role="dialog"] button[kind="secondary"]:hover {{
-        background: #b71c1c !important;
-        box-shadow: 0 0 28px rgba(198,40,40,1) !important;
-        transform: scale(1.04) !important;
-    }}
-    </style>
-    """, unsafe_allow_html=True)
+    st.html(CSS_BOTAO_FECHAR)
 
     col_inicio, col_espacador, col_fechar = st.columns([1, 5, 1])
     with col_inicio:
@@ -1007,7 +3169,7 @@ def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
 
     # Mini-resumo por status
     if "STATUS" in df_kpi.columns and df_kpi["STATUS"].nunique() > 1:
-        resumo = df_kpi["STATUS"].value_counts().reset_index()
+        resumo = df_kpi["STATUS"].value_counts().loc[lambda c: c > 0].reset_index()
         resumo.columns = ["STATUS", "QTD"]
         cols_r = st.columns(min(len(resumo), 5))
         for i, (_, row) in enumerate(resumo.iterrows()):
@@ -1021,7 +3183,7 @@ def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
                 </div>""", unsafe_allow_html=True)
         st.divider()
 
-    col_busca, col_filtro_status = st.columns([3, 1])
+    col_busca, col_filtro_status, col_tam_pag, col_modo = st.columns([3, 1, 1, 1])
     with col_busca:
         busca = st.text_input(
             "🔍 Busca rápida",
@@ -1034,15 +3196,30 @@ def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
             "Status", options=["TODOS"] + status_unicos,
             key=key_fsts, label_visibility="collapsed"
         )
+    with col_tam_pag:
+        tamanho_pagina = st.selectbox(
+            "Por página", options=OPCOES_CARDS_POR_PAGINA,
+            index=_preferencia_grade(f"_kpi_pag_tam_{titulo}", OPCOES_CARDS_POR_PAGINA, CARDS_POR_PAGINA_PADRAO),
+            format_func=lambda n: f"{n} por página",
+            key=f"_kpi_pag_tam_{titulo}", label_visibility="collapsed"
+        )
+        st.session_state[f"_kpi_pag_tam_{titulo}_pref"] = tamanho_pagina
+    with col_modo:
+        modo_grade = st.selectbox(
+            "Modo", options=list(MODOS_GRADE),
+            index=_preferencia_grade(f"_kpi_modo_{titulo}", list(MODOS_GRADE), MODO_GRADE_PADRAO),
+            format_func=MODOS_GRADE.get,
+            key=f"_kpi_modo_{titulo}", label_visibility="collapsed"
+        )
+        st.session_state[f"_kpi_modo_{titulo}_pref"] = modo_grade
 
-    df_exibir = df_kpi.copy()
+    # Busca pelo índice de n-gramas da planilha (sem converter o DataFrame em texto)
+    mask = np.ones(len(df_kpi), dtype=bool)
     if filtro_status != "TODOS":
-        df_exibir = df_exibir[df_exibir["STATUS"] == filtro_status]
+        mask &= (df_kpi["STATUS"] == filtro_status).to_numpy()
     if busca.strip():
-        mask = df_exibir.apply(
-            lambda col: col.astype(str).str.upper().str.contains(busca.strip().upper(), na=False)
-        ).any(axis=1)
-        df_exibir = df_exibir[mask]
+        mask &= indice_busca.buscar(busca, posicoes)
+    df_exibir = df_kpi[mask]
 
     # BUG FIX: dropna(axis=1) removia colunas que tinham NaN em QUALQUER linha filtrada,
     # fazendo o card perder campos válidos. Agora mantém todas as colunas do DataFrame.
@@ -1052,45 +3229,70 @@ def mostrar_detalhes_kpi(titulo, cor_hex, df_kpi):
     icone = '🔎' if busca.strip() or filtro_status != 'TODOS' else '📋'
     filtro_txt = (f" · filtro: *{busca.strip()}*" if busca.strip() else "")
     status_txt = (f" · status: *{filtro_status}*" if filtro_status != "TODOS" else "")
+    acao_txt   = ("Escolha o veículo em **ABRIR VEÍCULO**" if modo_grade == "lote"
+                  else "Clique em **▶ ABRIR**")
     st.markdown(f"""<span style="font-size:1rem; color:#aaaaaa;">
-    {icone} Exibindo **{total_exibindo}** veículo(s){filtro_txt}{status_txt}  —  Clique em **▶ ABRIR** para ver os detalhes completos
+    {icone} Exibindo **{total_exibindo}** veículo(s){filtro_txt}{status_txt}  —  {acao_txt} para ver os detalhes completos
     </span>""", unsafe_allow_html=True)
 
     if df_exibir.empty:
         st.warning("Nenhum veículo corresponde ao filtro.")
         return
 
-    NUM_COLS = 4
-    for row_start in range(0, total_exibindo, NUM_COLS):
+    pagina, n_paginas = _pagina_atual(titulo, total_exibindo, tamanho_pagina,
+                                      (busca.strip().upper(), filtro_status, tamanho_pagina))
+    inicio = pagina * tamanho_pagina
+    fim    = min(inicio + tamanho_pagina, total_exibindo)
+    _navegacao_paginas(titulo, pagina, n_paginas, inicio, fim, total_exibindo, "topo")
+
+    if modo_grade == "lote":
+        df_pagina = df_exibir.iloc[inicio:fim]
+        placas = {inicio + i: str(p).strip() for i, p in enumerate(df_pagina["PLACA"])}
+        key_widget = f"_kpi_abrir_{titulo}"
+        st.selectbox(
+            "ABRIR VEÍCULO", options=list(placas),
+            index=None, placeholder="▶ ABRIR VEÍCULO — selecione a placa",
+            format_func=lambda pos: f"🚛 {placas[pos]} · {df_exibir['STATUS'].iat[pos]}",
+            key=key_widget, label_visibility="collapsed",
+            on_change=_abrir_veiculo_da_grade, args=(key_widget, key_sel, placas),
+        )
+        st.markdown(_html_grade_cards(df_pagina), unsafe_allow_html=True)
+        _navegacao_paginas(titulo, pagina, n_paginas, inicio, fim, total_exibindo, "base")
+        return
+
+    df_pagina = df_exibir.iloc[inicio:fim]
+    cards = renderizar_mini_cards(df_pagina)
+    placas = _textos_coluna(df_pagina, "PLACA", "—")
+    NUM_COLS = CARDS_POR_LINHA
+    for row_start in range(inicio, fim, NUM_COLS):
         cols = st.columns(NUM_COLS)
         for col_idx in range(NUM_COLS):
             veiculo_idx = row_start + col_idx
-            if veiculo_idx >= total_exibindo:
+            if veiculo_idx >= fim:
                 break
-            veiculo    = df_exibir.iloc[veiculo_idx]
-            placa      = str(veiculo.get("PLACA", "—")).strip()
-            cor_status = CORES_STATUS.get(str(veiculo.get("STATUS", "")), "#888")
+            placa = placas[veiculo_idx - inicio]
 
             with cols[col_idx]:
                 # Mini card HTML completo e fechado num único markdown
-                st.markdown(_html_mini_card(veiculo), unsafe_allow_html=True)
+                st.markdown(cards[veiculo_idx - inicio], unsafe_allow_html=True)
                 # Botão nativo do Streamlit (sem wrapper de div aberta/fechada)
-                if st.button(
+                st.button(
                     "▶ ABRIR",
                     key=f"expand_{titulo}_{veiculo_idx}_{placa}",
-                    use_container_width=True
-                ):
-                    st.session_state[key_sel] = placa
-                    st.rerun()
+                    use_container_width=True,
+                    on_click=_selecionar_veiculo, args=(key_sel, key_aberto, placa)
+                )
+
+    _navegacao_paginas(titulo, pagina, n_paginas, inicio, fim, total_exibindo, "base")
 
 
 # =====================================================
 # INTERFACE
 # =====================================================
 def criar_header(taxa_disponibilidade=0.0):
-    logo_base64 = get_base64_image("logo_luft.png")
-    if logo_base64:
-        logo_html = f'<img src="data:image/png;base64,{logo_base64}" class="header-logo" alt="Logo Luft">'
+    logo_src = url_imagem("logo_luft.png", "logo_luft.png")
+    if logo_src:
+        logo_html = f'<img src="{logo_src}" class="header-logo" alt="Logo Luft">'
     else:
         logo_html = '<div class="header-logo-placeholder">🚨 TORRE DE CONTROLE</div>'
     st.markdown(f"""
@@ -1109,24 +3311,12 @@ def criar_header(taxa_disponibilidade=0.0):
     """, unsafe_allow_html=True)
 
 
-def criar_kpis(df_filtrado):
-    total          = len(df_filtrado)
-    df_total       = df_filtrado.copy()
-    df_operacao    = df_filtrado[df_filtrado["STATUS"].isin(["CARREGADO", "RETORNANDO DISPONÍVEIS"])].copy()
-    df_disponiveis = df_filtrado[df_filtrado["STATUS"].isin(["DISPONÍVEIS TRIPULADO", "DISPONÍVEIS NÃO TRIPULADO"])].copy()
-    df_manutencao  = df_filtrado[df_filtrado["STATUS"] == "MANUTENÇÃO"].copy()
-
-    em_operacao = len(df_operacao)
-    disponiveis = len(df_disponiveis)
-    manutencao  = len(df_manutencao)
-
-    # ── FIX: salvar os DataFrames dos KPIs no session_state ─────────────
-    # para que o dialog possa ser reaberto com os dados corretos após rerun
-    st.session_state["_kpi_df_TOTAL DE VEÍCULOS"]  = df_total
-    st.session_state["_kpi_df_EM OPERAÇÃO"]        = df_operacao
-    st.session_state["_kpi_df_DISPONÍVEIS"]        = df_disponiveis
-    st.session_state["_kpi_df_MANUTENÇÃO"]         = df_manutencao
-    # ────────────────────────────────────────────────────────────────────
+@st.fragment
+def criar_kpis(resumo):
+    total       = resumo.total
+    em_operacao = resumo.em_operacao
+    disponiveis = resumo.disponiveis
+    manutencao  = resumo.manutencao
 
     col1, col2, col3, col4 = st.columns(4)
 
@@ -1195,54 +3385,143 @@ def criar_sidebar(main_loading_placeholder):
         st.divider()
         st.subheader("📁 CARREGAR ARQUIVO")
 
-        uploaded_file = st.file_uploader(
-            "Faça upload do arquivo Excel", type=['xlsx', 'xls'],
-            help="Selecione o arquivo da planilha de frota",
-            label_visibility="collapsed"
-        )
+        fonte_monitorada = False
+        if ARQUIVO_MONITORADO:
+            fonte = st.radio(
+                "Fonte dos dados", ["📂 Arquivo monitorado", "📤 Upload"],
+                horizontal=True, key="_fonte_dados", label_visibility="collapsed"
+            )
+            fonte_monitorada = fonte == "📂 Arquivo monitorado"
 
         df_base = pd.DataFrame()
+        uploaded_files = []
 
-        if uploaded_file is not None:
+        if fonte_monitorada:
             show_loading_screen(main_loading_placeholder)
-            df_base = load_data_from_file(uploaded_file)
+            chave, df_base = carregar_arquivo_monitorado()
             main_loading_placeholder.empty()
-            if not df_base.empty:
-                st.success("✅ Arquivo carregado com sucesso!")
+            if chave is None:
+                st.warning(f"⚠️ Arquivo monitorado indisponível: {ARQUIVO_MONITORADO}")
+            else:
+                vigiar_arquivo_monitorado(chave)
+        else:
+            uploaded_files = st.file_uploader(
+                "Faça upload do arquivo Excel, CSV ou Parquet", type=['xlsx', 'xls', 'csv', 'parquet'],
+                help="Selecione a planilha de frota (ou a exportação do TMS) — ou várias, uma por filial/segmento",
+                accept_multiple_files=True, label_visibility="collapsed"
+            )
+
+            if uploaded_files:
+                # Abas disponíveis em qualquer dos arquivos; a padrão vem marcada.
+                # CSV/Parquet não têm abas ([]); sem a lista, vale a aba padrão.
+                abas_disponiveis = []
+                for arquivo in uploaded_files:
+                    dados = arquivo.getvalue()
+                    abas_arquivo = obter_abas(chave_conteudo(dados), dados)
+                    for aba in [ABA_FROTA] if abas_arquivo is None else abas_arquivo:
+                        if aba not in abas_disponiveis:
+                            abas_disponiveis.append(aba)
+                abas = abas_disponiveis or [ABA_FROTA]
+                if len(abas_disponiveis) > 1:
+                    abas = st.multiselect(
+                        "🗂️ ABAS", abas_disponiveis,
+                        default=[ABA_FROTA] if ABA_FROTA in abas_disponiveis else None,
+                        format_func=lambda aba: aba.strip() or aba, key="_abas_fonte",
+                    )
+                if abas:
+                    show_loading_screen(main_loading_placeholder)
+                    chave, df_base = carregar_fontes(uploaded_files, abas)
+                    main_loading_placeholder.empty()
+                    if not df_base.empty:
+                        n_fontes = df_base[COLUNA_FONTE].nunique() if COLUNA_FONTE in df_base.columns else 1
+                        st.success("✅ Arquivo carregado com sucesso!" if n_fontes == 1
+                                   else f"✅ {n_fontes} fontes carregadas!")
+                else:
+                    st.info("🗂️ Selecione as abas com a frota.")
 
         st.divider()
 
         if df_base.empty:
-            st.info("⬆️ Faça upload de um arquivo Excel para visualizar os dados.")
-            return pd.DataFrame(), [], [], [], []
+            if not fonte_monitorada and not uploaded_files:
+                st.info("⬆️ Faça upload de um arquivo Excel, CSV ou Parquet para visualizar os dados.")
+            return pd.DataFrame(), None, None, {}
+
+        indice = obter_indice_filtros(chave, df_base)
+        cubo = obter_cubo_frota(chave, df_base)
 
         incluir_todos_status = st.checkbox("📋 Incluir TODOS os STATUS", value=False)
         STATUS_PARA_USAR = STATUS_OFICIAIS + STATUS_ADICIONAIS if incluir_todos_status else STATUS_OFICIAIS
-        df_base_filtrado = df_base[df_base["STATUS"].isin(STATUS_PARA_USAR)].copy()
+        mascara_base = indice.mascara("STATUS", STATUS_PARA_USAR)
 
-        status_disponiveis = sorted([s for s in df_base_filtrado["STATUS"].unique() if s in STATUS_PARA_USAR])
+        def valores_disponiveis(dim):
+            # Opções de cada filtro: recorte do cubo, ou as máscaras quando não há cubo
+            if cubo is not None:
+                return sorted(cubo.valores(dim, {"STATUS": STATUS_PARA_USAR}))
+            return sorted(indice.valores(dim, mascara_base))
+
+        status_disponiveis = valores_disponiveis("STATUS")
         status_sel = st.multiselect("📊 STATUS", status_disponiveis, default=status_disponiveis)
 
-        tipos_disponiveis = sorted([t for t in df_base_filtrado["TIPO"].unique() if pd.notna(t) and t != ""])
+        tipos_disponiveis = valores_disponiveis("TIPO")
         tipo_sel = st.multiselect("🚛 TIPO DE VEÍCULO", tipos_disponiveis, default=tipos_disponiveis)
 
-        posicoes_disponiveis = sorted([p for p in df_base_filtrado["POSIÇÃO ATUAL"].unique() if pd.notna(p) and p != ""])
+        posicoes_disponiveis = valores_disponiveis("POSIÇÃO ATUAL")
         pos_sel = st.multiselect("📍 POSIÇÃO ATUAL", posicoes_disponiveis, default=posicoes_disponiveis)
 
-        if "UF_ORIGEM" in df_base_filtrado.columns:
-            ufs_disponiveis = sorted([u for u in df_base_filtrado["UF_ORIGEM"].unique() if pd.notna(u) and u != ""])
+        # STATUS escolhidos são sempre um subconjunto de STATUS_PARA_USAR,
+        # então a seleção já carrega o recorte de status oficiais
+        selecao = {"STATUS": status_sel, "TIPO": tipo_sel, "POSIÇÃO ATUAL": pos_sel}
+
+        if "UF_ORIGEM" in df_base.columns:
+            ufs_disponiveis = valores_disponiveis("UF_ORIGEM")
             uf_sel = st.multiselect("🗺️ UF DE ORIGEM", ufs_disponiveis, default=ufs_disponiveis)
-        else:
-            uf_sel = []
+            if uf_sel:
+                selecao["UF_ORIGEM"] = uf_sel
 
         if st.button("🔄 ATUALIZAR DADOS AGORA", use_container_width=True):
-            st.cache_data.clear()
+            # Refaz só a planilha exibida; as outras em cache ficam como estão
+            invalidar_planilha(chave)
+            if fonte_monitorada:
+                obter_arquivo_monitorado(ARQUIVO_MONITORADO).esquecer()
             st.rerun()
 
-        return df_base_filtrado, status_sel, tipo_sel, pos_sel, uf_sel
+        if not mascara_base.any():
+            return pd.DataFrame(), None, None, {}
+
+        return df_base, chave, indice, selecao
 
 
-def criar_painel_status(status_df):
+@st.fragment
+def criar_painel_mudancas(diferenca):
+    """Painel "o que mudou desde a última atualização": entradas, saídas e mudanças por placa."""
+    with st.container(border=True):
+        st.markdown('<div class="card-title">🔄 O QUE MUDOU DESDE A ÚLTIMA ATUALIZAÇÃO</div>', unsafe_allow_html=True)
+        if diferenca.vazia:
+            st.caption("✔️ Nenhuma mudança em relação à versão anterior da planilha.")
+            return
+        n_alterados = diferenca.alteracoes["PLACA"].nunique()
+        st.markdown(
+            f"➕ **{len(diferenca.entradas)}** entraram  ·  ➖ **{len(diferenca.saidas)}** saíram  ·  "
+            f"🔁 **{len(diferenca.transicoes)}** mudaram de status  ·  ✏️ **{n_alterados}** com alguma alteração"
+        )
+        with st.expander("Ver detalhes", expanded=False):
+            col_trans, col_ent, col_sai = st.columns([2, 1, 1])
+            with col_trans:
+                st.markdown("**🔁 Mudanças de status**")
+                st.dataframe(diferenca.transicoes, hide_index=True, use_container_width=True, height=240)
+            with col_ent:
+                st.markdown("**➕ Entraram**")
+                st.dataframe(diferenca.entradas[["PLACA", "STATUS"]], hide_index=True, use_container_width=True, height=240)
+            with col_sai:
+                st.markdown("**➖ Saíram**")
+                st.dataframe(diferenca.saidas[["PLACA", "STATUS"]], hide_index=True, use_container_width=True, height=240)
+            outras = diferenca.alteracoes[diferenca.alteracoes["COLUNA"] != "STATUS"]
+            if not outras.empty:
+                st.markdown("**✏️ Outras alterações**")
+                st.dataframe(outras, hide_index=True, use_container_width=True, height=240)
+
+@st.fragment
+def criar_painel_status(resumo):
     with st.container(border=True):
         col_t, col_b = st.columns([11, 1])
         with col_t:
@@ -1253,9 +3532,10 @@ def criar_painel_status(status_df):
                 st.session_state["_grafico_fs"] = "status"
                 st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
-        st.plotly_chart(criar_grafico_status(status_df), use_container_width=True, config={'displayModeBar': False})
+        st.plotly_chart(figura_grafico("status", resumo), use_container_width=True, config={'displayModeBar': False})
 
-def criar_painel_uf(uf_df):
+@st.fragment
+def criar_painel_uf(resumo):
     with st.container(border=True):
         col_t, col_b = st.columns([11, 1])
         with col_t:
@@ -1266,9 +3546,10 @@ def criar_painel_uf(uf_df):
                 st.session_state["_grafico_fs"] = "uf"
                 st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
-        st.plotly_chart(criar_grafico_uf_origem(uf_df), use_container_width=True, config={'displayModeBar': False})
+        st.plotly_chart(figura_grafico("uf", resumo), use_container_width=True, config={'displayModeBar': False})
 
-def criar_painel_tipo(tipo_df):
+@st.fragment
+def criar_painel_tipo(resumo):
     with st.container(border=True):
         col_t, col_b = st.columns([11, 1])
         with col_t:
@@ -1279,9 +3560,10 @@ def criar_painel_tipo(tipo_df):
                 st.session_state["_grafico_fs"] = "tipo"
                 st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
-        st.plotly_chart(criar_grafico_tipo(tipo_df), use_container_width=True, config={'displayModeBar': False})
+        st.plotly_chart(figura_grafico("tipo", resumo), use_container_width=True, config={'displayModeBar': False})
 
-def criar_painel_posicao(posicao_df):
+@st.fragment
+def criar_painel_posicao(resumo):
     with st.container(border=True):
         col_t, col_b = st.columns([11, 1])
         with col_t:
@@ -1292,10 +3574,10 @@ def criar_painel_posicao(posicao_df):
                 st.session_state["_grafico_fs"] = "posicao"
                 st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
-        st.plotly_chart(criar_grafico_posicao(posicao_df), use_container_width=True, config={'displayModeBar': False})
+        st.plotly_chart(figura_grafico("posicao", resumo), use_container_width=True, config={'displayModeBar': False})
 
 
-def mostrar_grafico_fullscreen(grafico_id, status_df, tipo_df, posicao_df, uf_origem_df):
+def mostrar_grafico_fullscreen(grafico_id, resumo):
     """Renderiza o gráfico escolhido em modo tela cheia com botão fechar."""
     titulos = {
         "status":  "📊 STATUS DA FROTA",
@@ -1305,13 +3587,7 @@ def mostrar_grafico_fullscreen(grafico_id, status_df, tipo_df, posicao_df, uf_or
     }
     titulo = titulos.get(grafico_id, "")
 
-    st.markdown(f"""
-    <style>
-    section[data-testid="stSidebar"] {{ display: none !important; }}
-    .stApp {{ background: #141414 !important; }}
-    .main .block-container {{ padding: 1rem 1.5rem !important; max-width: 100% !important; background: #141414 !important; }}
-    </style>
-    """, unsafe_allow_html=True)
+    st.html(CSS_GRAFICO_TELA_CHEIA)
 
     col_titulo, col_fechar = st.columns([10, 2])
     with col_titulo:
@@ -1323,22 +3599,13 @@ def mostrar_grafico_fullscreen(grafico_id, status_df, tipo_df, posicao_df, uf_or
 
     st.markdown("<hr style='border-color:#484848;margin:0 0 12px 0;'>", unsafe_allow_html=True)
 
-    if grafico_id == "status":
-        fig = criar_grafico_status(status_df)
-        fig.update_layout(height=680, margin=dict(l=10, r=10, t=20, b=10), paper_bgcolor='#141414', plot_bgcolor='#141414')
-    elif grafico_id == "posicao":
-        fig = criar_grafico_posicao(posicao_df, fullscreen=True)
-    elif grafico_id == "tipo":
-        fig = criar_grafico_tipo(tipo_df)
-        fig.update_layout(height=680, margin=dict(l=10, r=10, t=20, b=10), paper_bgcolor='#141414', plot_bgcolor='#141414')
-    elif grafico_id == "uf":
-        fig = criar_grafico_uf_origem(uf_origem_df)
-        fig.update_layout(height=680, margin=dict(l=10, r=10, t=20, b=10), paper_bgcolor='#141414', plot_bgcolor='#141414')
-    else:
+    if grafico_id not in GRAFICOS:
         st.stop()
+    fig = figura_grafico(grafico_id, resumo, MODO_TELA_CHEIA)
 
     st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
 
+@st.fragment
 def criar_tabela_detalhada(df_filtrado):
     with st.container(border=True):
         st.markdown('<div class="card-title">📋 DETALHAMENTO COMPLETO DA FROTA</div>', unsafe_allow_html=True)
@@ -1350,10 +3617,20 @@ def criar_tabela_detalhada(df_filtrado):
         if "UF_DESTINO" in df_filtrado.columns:
             colunas_exibir.append("UF_DESTINO")
         colunas_exibir.append("MOTORISTA")
-        df_display = df_filtrado[colunas_exibir].copy()
+        df_display = df_filtrado[colunas_exibir]
+        if len(df_display) <= LIMITE_LINHAS_ESTILO:
+            st.dataframe(
+                df_display.style.apply(estilos_tabela_status, axis=None),
+                hide_index=True, use_container_width=True, height=400
+            )
+            return
+        # Tabela grande: sem Styler; a grade do st.dataframe já é virtualizada
+        # e o marcador sai de um map por categoria do STATUS
+        marcador = df_display["STATUS"].map(MARCADORES_STATUS).astype(object).fillna("⚪")
         st.dataframe(
-            df_display.style.apply(aplicar_cor_status, axis=1),
-            hide_index=True, use_container_width=True, height=400
+            df_display.assign(**{" ": marcador})[[" "] + colunas_exibir],
+            hide_index=True, use_container_width=True, height=400,
+            column_config={" ": st.column_config.TextColumn(" ", width=40)},
         )
 
 
@@ -1363,52 +3640,36 @@ def criar_tabela_detalhada(df_filtrado):
 
 def main():
     load_custom_css()
-    
-    # Fix tooltip color via JS (Streamlit gera classes dinâmicas)
-    st.markdown("""<script>
-    (function(){
-        var style = document.createElement('style');
-        style.textContent = '[class*="TooltipContent"],[class*="tooltip"]{background:#1a1a1a!important;color:#fff!important;border:1px solid #555!important;}[class*="TooltipContent"] *{color:#fff!important;}';
-        document.head.appendChild(style);
-    })();
-    </script>""", unsafe_allow_html=True)
     loading_placeholder = st.empty()
 
-    df_base_filtrado, status_sel, tipo_sel, pos_sel, uf_sel = criar_sidebar(loading_placeholder)
+    df_base, chave, indice, selecao = criar_sidebar(loading_placeholder)
 
-    if df_base_filtrado.empty:
+    if df_base.empty:
         st.markdown("""
-        <style>
-        .centered-warning { display: flex; justify-content: center; align-items: center; min-height: 60vh; text-align: center; }
-        .warning-box { background-color: #1e1e1e; border: 2px solid #ff9800; border-radius: 15px; padding: 40px 60px; box-shadow: 0 0 20px rgba(255, 152, 0, 0.3); }
-        .warning-icon { font-size: 4rem; margin-bottom: 20px; }
-        .warning-text { font-size: 1.3rem; color: #ffffff; font-weight: 600; line-height: 1.6; }
-        </style>
         <div class="centered-warning">
             <div class="warning-box">
                 <div class="warning-icon">⚠️</div>
-                <div class="warning-text">Por favor, carregue um arquivo Excel<br>na barra lateral para visualizar os dados.</div>
+                <div class="warning-text">Por favor, carregue um arquivo Excel, CSV ou Parquet<br>na barra lateral para visualizar os dados.</div>
             </div>
         </div>
         """, unsafe_allow_html=True)
         st.stop()
 
-    filtro_aplicado = (
-        (df_base_filtrado["STATUS"].isin(status_sel)) &
-        (df_base_filtrado["TIPO"].isin(tipo_sel)) &
-        (df_base_filtrado["POSIÇÃO ATUAL"].isin(pos_sel))
-    )
-    if "UF_ORIGEM" in df_base_filtrado.columns and uf_sel:
-        filtro_aplicado = filtro_aplicado & (df_base_filtrado["UF_ORIGEM"].isin(uf_sel))
+    # Versão anterior × atual da planilha (None enquanto só houve uma carga na sessão)
+    diferenca = registrar_snapshot(chave, df_base)
 
-    df_filtrado = df_base_filtrado[filtro_aplicado].copy()
+    filtro_aplicado = indice.filtrar(selecao)
+    df_filtrado = df_base[filtro_aplicado]
 
-    manutencao_count = len(df_filtrado[df_filtrado["STATUS"] == "MANUTENÇÃO"])
-    taxa_disponibilidade = ((len(df_filtrado) - manutencao_count) / len(df_filtrado) * 100) if len(df_filtrado) > 0 else 0.0
+    # KPIs e gráficos saem do cubo da planilha; sem cubo (grande demais), das linhas filtradas
+    cubo = obter_cubo_frota(chave, df_base)
+    resumo = cubo.agregar(selecao) if cubo is not None else agregar_frota(df_base, filtro_aplicado)
 
-    criar_header(taxa_disponibilidade)
+    criar_header(resumo.taxa_disponibilidade)
 
-    em_operacao, disponiveis, manutencao = criar_kpis(df_filtrado)
+    # Posições das linhas de cada KPI — o dialog é reaberto com os dados corretos após rerun
+    registrar_subconjuntos_kpi(chave, indice, filtro_aplicado)
+    em_operacao, disponiveis, manutencao = criar_kpis(resumo)
     st.markdown("<br>", unsafe_allow_html=True)
 
     # ── Modo fullscreen KPI ──────────────────────────────────────────────
@@ -1421,49 +3682,42 @@ def main():
     for titulo_kpi, cor_kpi in kpis_config:
         key_sel    = f"_kpi_sel_{titulo_kpi}"
         key_aberto = f"_kpi_aberto_{titulo_kpi}"
-        key_df     = f"_kpi_df_{titulo_kpi}"
-        if (st.session_state.get(key_sel) or st.session_state.get(key_aberto)) and key_df in st.session_state:
-            mostrar_detalhes_kpi(titulo_kpi, cor_kpi, st.session_state[key_df])
-            st.stop()  # não renderiza o resto da página
+        if st.session_state.get(key_sel) or st.session_state.get(key_aberto):
+            posicoes, df_kpi = obter_subconjunto_kpi(titulo_kpi, chave, df_base)
+            if df_kpi is not None:
+                mostrar_detalhes_kpi(titulo_kpi, cor_kpi, df_kpi, posicoes,
+                                     obter_indice_busca(chave, df_base),
+                                     obter_indice_placas(chave, df_base),
+                                     chave)
+                st.stop()  # não renderiza o resto da página
     # ─────────────────────────────────────────────────────────────────────
 
-    status_counts = df_filtrado["STATUS"].value_counts()
-    status_df = pd.DataFrame({
-        "STATUS": [s for s in ORDEM_STATUS if s in status_counts.index],
-        "QUANTIDADE": [status_counts.get(s, 0) for s in ORDEM_STATUS if s in status_counts.index]
-    })
-    status_df = status_df[status_df["QUANTIDADE"] > 0]
-
-    tipo_df    = df_filtrado["TIPO"].value_counts().reset_index().rename(columns={"count": "QUANTIDADE"})
-    posicao_df = df_filtrado["POSIÇÃO ATUAL"].value_counts().reset_index().rename(columns={"count": "QUANTIDADE"})
-
-    if "UF_ORIGEM" in df_filtrado.columns:
-        uf_origem_df = df_filtrado["UF_ORIGEM"].value_counts().reset_index().rename(columns={"count": "QUANTIDADE"})
-    else:
-        uf_origem_df = pd.DataFrame()
-
     # ── Modo tela cheia de gráfico ──────────────────────────────────────
     if st.session_state.get("_grafico_fs"):
-        mostrar_grafico_fullscreen(
-            st.session_state["_grafico_fs"],
-            status_df, tipo_df, posicao_df, uf_origem_df
-        )
+        mostrar_grafico_fullscreen(st.session_state["_grafico_fs"], resumo)
         st.stop()
     # ────────────────────────────────────────────────────────────────────
 
+    if diferenca is not None:
+        criar_painel_mudancas(diferenca)
+        st.markdown("<br>", unsafe_allow_html=True)
+
+    # KPIs, painéis e tabela são fragments (@st.fragment): uma interação dentro
+    # deles reexecuta só o próprio bloco. Os botões que trocam a página inteira
+    # (abrir KPI, tela cheia) continuam chamando st.rerun() do app.
     col_graf1, col_graf2 = st.columns(2)
     with col_graf1:
-        criar_painel_status(status_df)
+        criar_painel_status(resumo)
     with col_graf2:
-        criar_painel_posicao(posicao_df)
+        criar_painel_posicao(resumo)
 
     st.markdown("<br>", unsafe_allow_html=True)
     col_graf4, col_graf5 = st.columns(2)
     with col_graf4:
-        criar_painel_tipo(tipo_df)
+        criar_painel_tipo(resumo)
     with col_graf5:
-        if not uf_origem_df.empty:
-            criar_painel_uf(uf_origem_df)
+        if not resumo.uf_origem_df.empty:
+            criar_painel_uf(resumo)
 
     st.markdown("<br>", unsafe_allow_html=True)
     criar_tabela_detalhada(df_filtrado)